@@ -0,0 +1,27 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .permissions import get_permission_snapshot
+
+
+class PermissionSnapshotBackend(ModelBackend):
+    """
+    `ModelBackend` answering model level permission checks (`user.has_perm(...)`,
+    `user.get_all_permissions()`) from the request's `PermissionSnapshot`, so every view,
+    serializer and submission type of a request shares a single permission query.
+    Object permissions keep the `ModelBackend` behaviour (none).
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if obj is not None or not user_obj.is_active or user_obj.is_anonymous:
+            return set()
+        return set(get_permission_snapshot(user_obj).permissions)
+
+    def get_user_permissions(self, user_obj, obj=None):
+        # The snapshot doesn't tell own permissions from group ones; `get_all_permissions`
+        # is what permission checks use.
+        return super().get_user_permissions(user_obj, obj)
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if obj is not None:
+            return False
+        return get_permission_snapshot(user_obj).has_perm(perm)
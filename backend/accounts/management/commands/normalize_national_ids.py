@@ -0,0 +1,48 @@
+"""
+Rewrite stored national ids in their normalized form (Latin digits, no spacing) and report
+ids shared by several users.
+
+The unique constraint on `User.national_id` cannot be applied while duplicates exist; run
+this with `--dry-run` before migrating an existing database and resolve what it reports.
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from accounts.validators import normalize_national_id
+
+
+class Command(BaseCommand):
+    help = "Normalize stored national ids and list duplicates. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would change.",
+        )
+
+    def handle(self, *args, **options):
+        changed = []
+        for user in User.objects.exclude(national_id="").only("pk", "national_id").iterator(chunk_size=1000):
+            normalized = normalize_national_id(user.national_id)
+            if normalized != user.national_id:
+                user.national_id = normalized
+                changed.append(user)
+
+        if not options["dry_run"]:
+            User.objects.bulk_update(changed, ["national_id"], batch_size=1000)
+        self.stdout.write(f"Normalized {len(changed)} national id(s).")
+
+        normalized_ids = {user.pk: user.national_id for user in changed}
+        counts = {}
+        for pk, national_id in User.objects.exclude(national_id="").values_list("pk", "national_id"):
+            national_id = normalized_ids.get(pk, national_id)
+            counts[national_id] = counts.get(national_id, 0) + 1
+        duplicates = sorted(national_id for national_id, count in counts.items() if count > 1)
+
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f"{len(duplicates)} national id(s) are used by several users: {', '.join(duplicates)}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("No duplicate national ids."))
@@ -16,6 +16,8 @@ from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
 
+from accounts.permissions import bump_permissions_version
+
 
 # (app_label, model (lowercase), codename)
 def _perm(app_label: str, model: str, codename: str) -> tuple[str, str, str]:
@@ -157,4 +159,6 @@ class Command(BaseCommand):
         else:
             with transaction.atomic():
                 run()
+            # Cached permission snapshots of every user are read again
+            bump_permissions_version()
             self.stdout.write(self.style.SUCCESS("Done. Run with --dry-run to see planned changes."))
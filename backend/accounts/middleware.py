@@ -0,0 +1,59 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from .permissions import _request_snapshots
+
+logger = logging.getLogger(__name__)
+
+PERMISSION_TABLES = ("auth_permission", "auth_group_permissions", "accounts_user_user_permissions")
+
+
+class PermissionSnapshotMiddleware:
+    """
+    Scope permission snapshots (`accounts.permissions.get_permission_snapshot`) to the request.
+
+    With `PERMISSION_QUERY_STATS` on, the queries reading permission tables are counted and
+    reported per endpoint in the log and in the `X-Permission-Queries` response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_snapshots.set({})
+        try:
+            if not settings.PERMISSION_QUERY_STATS:
+                return self.get_response(request)
+
+            counter = PermissionQueryCounter()
+            with connection.execute_wrapper(counter):
+                response = self.get_response(request)
+            logger.info(
+                "%s %s: %d permission queries",
+                request.method,
+                _endpoint(request),
+                counter.count,
+            )
+            response["X-Permission-Queries"] = str(counter.count)
+            return response
+        finally:
+            _request_snapshots.reset(token)
+
+
+class PermissionQueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if any(table in sql for table in PERMISSION_TABLES):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _endpoint(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is not None and match.route:
+        return match.view_name or match.route
+    return request.path
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 from core import settings
 from . import validators as customValidators
@@ -13,6 +14,7 @@ class User(AbstractUser):
         
     national_id = models.CharField(
         max_length=10,
+        db_index=True,
         validators=[customValidators.validate_national_id]
     )
     phone_number = models.CharField(
@@ -24,3 +26,17 @@ class User(AbstractUser):
         choices=Status.choices, 
         default=Status.FREE
     )
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Users created without a national id (e.g. staff) keep it empty
+            models.UniqueConstraint(
+                fields=["national_id"],
+                condition=~Q(national_id=""),
+                name="user_national_id_unique",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.national_id = customValidators.normalize_national_id(self.national_id)
+        super().save(*args, **kwargs)
@@ -0,0 +1,235 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import CharField, F, IntegerField, Q, Value
+
+# Snapshots of the request being served, by user id. None outside requests.
+_request_snapshots: ContextVar[dict | None] = ContextVar("permission_snapshots", default=None)
+
+# Cached snapshots are keyed by these versions, so bumping one invalidates every snapshot
+PERMISSIONS_VERSION_KEY = "accounts:permissions_version"
+CASE_ASSIGNMENTS_VERSION_KEY = "accounts:case_assignments_version"
+SNAPSHOT_CACHE_KEY = "accounts:permission_snapshot:{user}:{permissions_version}:{case_assignments_version}"
+
+PERMISSION_ROW = "perm"
+LEAD_DETECTIVE_ROW = "lead"
+SUPERVISOR_ROW = "supervisor"
+COMPLAINANT_ROW = "complainant"
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """
+    Everything permission checks need to know about a user: their permissions
+    (`"app_label.codename"`, own and through groups), the cases they hold a role in and the
+    status of those cases.
+    """
+    user_id: int | None
+    is_active: bool
+    is_superuser: bool
+    permissions: frozenset[str]
+    lead_detective_case_ids: frozenset[int] = frozenset()
+    supervisor_case_ids: frozenset[int] = frozenset()
+    complainant_case_ids: frozenset[int] = frozenset()
+    case_statuses: dict[int, str] = field(default_factory=dict)
+
+    def has_perm(self, perm: str) -> bool:
+        if not self.is_active:
+            return False
+        return self.is_superuser or perm in self.permissions
+
+    def has_perms(self, perms) -> bool:
+        return all(self.has_perm(perm) for perm in perms)
+
+    @property
+    def assigned_case_ids(self) -> frozenset[int]:
+        """Cases the user leads or supervises."""
+        return self.lead_detective_case_ids | self.supervisor_case_ids
+
+    def has_case_in_status(self, case_ids, status: str) -> bool:
+        """Whether one of `case_ids` (cases of the user, e.g. `lead_detective_case_ids`) is in `status`."""
+        return any(self.case_statuses.get(case_id) == status for case_id in case_ids)
+
+
+ANONYMOUS_SNAPSHOT = PermissionSnapshot(user_id=None, is_active=False, is_superuser=False, permissions=frozenset())
+
+
+def load_permission_snapshot(user) -> PermissionSnapshot:
+    """
+    Build the snapshot of `user` with a single query: the user's and their groups'
+    permissions UNION ALL the cases they lead, supervise or filed, with their status (in the
+    codename column).
+    """
+    from cases.models import Case
+
+    def rows(queryset, kind, app_label, codename, case_id):
+        return queryset.annotate(
+            row_kind=Value(kind, output_field=CharField()),
+            row_app_label=app_label,
+            row_codename=codename,
+            row_case_id=case_id,
+        ).values_list("row_kind", "row_app_label", "row_codename", "row_case_id")
+
+    no_text = Value("", output_field=CharField())
+    no_case = Value(None, output_field=IntegerField())
+
+    if user.is_superuser:
+        permissions = Permission.objects.all()
+    else:
+        permissions = Permission.objects.filter(Q(user=user) | Q(group__user=user)).distinct()
+
+    query = rows(permissions, PERMISSION_ROW, F("content_type__app_label"), F("codename"), no_case).order_by()
+    for kind, role in (
+        (LEAD_DETECTIVE_ROW, "lead_detective"),
+        (SUPERVISOR_ROW, "supervisor"),
+        (COMPLAINANT_ROW, "complainants"),
+    ):
+        cases = Case.objects.filter(**{role: user}).order_by()
+        query = query.union(rows(cases, kind, no_text, F("status"), F("id")), all=True)
+
+    permission_names = set()
+    case_ids = {LEAD_DETECTIVE_ROW: set(), SUPERVISOR_ROW: set(), COMPLAINANT_ROW: set()}
+    case_statuses = {}
+    if user.is_active:
+        for kind, app_label, codename, case_id in query:
+            if kind == PERMISSION_ROW:
+                permission_names.add(f"{app_label}.{codename}")
+            else:
+                case_ids[kind].add(case_id)
+                case_statuses[case_id] = codename
+
+    return PermissionSnapshot(
+        user_id=user.pk,
+        is_active=user.is_active,
+        is_superuser=user.is_superuser,
+        permissions=frozenset(permission_names),
+        lead_detective_case_ids=frozenset(case_ids[LEAD_DETECTIVE_ROW]),
+        supervisor_case_ids=frozenset(case_ids[SUPERVISOR_ROW]),
+        complainant_case_ids=frozenset(case_ids[COMPLAINANT_ROW]),
+        case_statuses=case_statuses,
+    )
+
+
+def _get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version lost from the cache never reuses an old number
+        cache.add(key, time.time_ns())
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns())
+
+
+def get_permissions_version() -> int:
+    return _get_version(PERMISSIONS_VERSION_KEY)
+
+
+def get_case_assignments_version() -> int:
+    return _get_version(CASE_ASSIGNMENTS_VERSION_KEY)
+
+
+def _bump_on_commit(key: str) -> None:
+    transaction.on_commit(partial(_bump_version, key))
+    clear_permission_snapshots()
+
+
+def versions_bump_pending() -> bool:
+    """
+    Whether the current transaction changed permissions or case assignments. Until it commits,
+    the changes are only visible to it, so the shared cache is neither read nor filled.
+    """
+    return any(
+        isinstance(func, partial) and func.func is _bump_version
+        for _, func, _ in connection.run_on_commit
+    )
+
+
+def versioned_cache_usable() -> bool:
+    """
+    Whether data keyed by the permissions and case assignments versions may be cached: the cache
+    must be shared by every worker, or bumps made by one worker would never reach the others,
+    and no bump may be pending in the current transaction.
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache)) and not versions_bump_pending()
+
+
+def user_cache_key(user) -> str:
+    """
+    Identifies `user` in cache keys. `date_joined` guards against ids handed out again (SQLite
+    reuses the ids of rolled back rows); activation and superuser flags are stored on the user
+    row rather than versioned.
+    """
+    return f"{user.pk}:{int(user.date_joined.timestamp() * 1_000_000)}:{int(user.is_active)}{int(user.is_superuser)}"
+
+
+def bump_permissions_version() -> None:
+    """Invalidate every cached snapshot once permissions or group memberships changed."""
+    _bump_on_commit(PERMISSIONS_VERSION_KEY)
+
+
+def bump_case_assignments_version() -> None:
+    """
+    Invalidate every cached snapshot once case leads, supervisors or complainants changed, or
+    the status of a case with a lead or supervisor (what they may submit depends on it).
+    """
+    _bump_on_commit(CASE_ASSIGNMENTS_VERSION_KEY)
+
+
+def get_cached_permission_snapshot(user) -> PermissionSnapshot:
+    """
+    The snapshot of `user` from the shared cache, loaded and stored on a miss. Snapshots are
+    keyed by the permissions and case assignments versions, so they are never read once stale.
+    Without a shared cache (`versioned_cache_usable`) every call loads the snapshot.
+    """
+    if not versioned_cache_usable():
+        return load_permission_snapshot(user)
+
+    key = SNAPSHOT_CACHE_KEY.format(
+        user=user_cache_key(user),
+        permissions_version=get_permissions_version(),
+        case_assignments_version=get_case_assignments_version(),
+    )
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = load_permission_snapshot(user)
+        cache.set(key, snapshot, settings.PERMISSION_SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_permission_snapshot(user) -> PermissionSnapshot:
+    """
+    The permission snapshot of `user`, read from the shared cache once per request (see
+    `PermissionSnapshotMiddleware`). Outside a request it is read on every call.
+    """
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS_SNAPSHOT
+
+    snapshots = _request_snapshots.get()
+    if snapshots is not None and user.pk in snapshots:
+        return snapshots[user.pk]
+
+    snapshot = get_cached_permission_snapshot(user)
+    if snapshots is not None:
+        snapshots[user.pk] = snapshot
+    return snapshot
+
+
+def clear_permission_snapshots() -> None:
+    """Drop the snapshots loaded by the current request, after its permissions or case roles changed."""
+    snapshots = _request_snapshots.get()
+    if snapshots is not None:
+        snapshots.clear()
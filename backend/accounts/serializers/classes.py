@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
+from rest_framework.validators import UniqueValidator
 from accounts.models import User
 import re
 from .fields import PhoneNumberField, NationalIDField
@@ -7,7 +8,9 @@ from payments.models import BailRequest
 
 class UserSerializer(ModelSerializer):
     phone_number = PhoneNumberField()
-    national_id = NationalIDField()
+    national_id = NationalIDField(
+        validators=[UniqueValidator(User.objects.all(), message="A user with this national ID already exists.")]
+    )
 
     class Meta:
         model = User
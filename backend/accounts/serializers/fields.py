@@ -35,7 +35,7 @@ class NationalIDField(serializers.CharField):
 
     def to_internal_value(self, data):
         value = super().to_internal_value(data)
-        value = str(value).strip()
+        value = validators.normalize_national_id(value)
 
         if not value:
             raise DRFValidationError(self.error_messages["required"])
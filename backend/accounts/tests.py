@@ -1,7 +1,16 @@
+import shutil
+import tempfile
+
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
+
+from cases.models import Case
+from .permissions import _request_snapshots, get_permission_snapshot, load_permission_snapshot
 
 User = get_user_model()
 
@@ -31,6 +40,16 @@ class AuthFlowTests(APITestCase):
         self.assertEqual(r.status_code, status.HTTP_200_OK)
         self.assertIn("access", r.data)
 
+    def test_signup_normalizes_and_rejects_duplicate_national_id(self):
+        signup_payload = {"username": "alice", "password": "strongpassword123", "email": "alice@example.com", "first_name": "Alice", "last_name": "A", "national_id": "۲۵۸۱۸۰۱۹۸۰", "phone_number": "09112405786"}
+        r = self.client.post(self.signup_url, signup_payload, format="json")
+        self.assertEqual(r.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(username="alice").national_id, "2581801980")
+
+        r = self.client.post(self.signup_url, {**signup_payload, "username": "alice2", "national_id": "2581 801 980"}, format="json")
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("national_id", r.json())
+
     def test_login_wrong_password_fails(self):
         User.objects.create_user(username="bob", password="correctpassword123")
 
@@ -41,3 +60,135 @@ class AuthFlowTests(APITestCase):
         )
         self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertIn("detail", r.data)
+
+
+class PermissionSnapshotFixture:
+    def setUp(self):
+        self.detective = User.objects.create_user(username="detective", password="password123")
+        group = Group.objects.create(name="Detectives")
+        group.permissions.add(Permission.objects.get(codename="investigate_on_case"))
+        self.detective.groups.add(group)
+        self.detective.user_permissions.add(Permission.objects.get(codename="jury_case"))
+
+        self.led = Case.objects.create(title="Led", description="d", crime_datetime=timezone.now(), lead_detective=self.detective)
+        self.filed = Case.objects.create(title="Filed", description="d", crime_datetime=timezone.now())
+        self.filed.complainants.add(self.detective)
+
+
+class PermissionSnapshotTests(PermissionSnapshotFixture, APITestCase):
+    def test_snapshot_is_loaded_in_one_query(self):
+        user = User.objects.get(pk=self.detective.pk)
+        with self.assertNumQueries(1):
+            snapshot = load_permission_snapshot(user)
+        self.assertTrue(snapshot.has_perms(["cases.investigate_on_case", "cases.jury_case"]))
+        self.assertFalse(snapshot.has_perm("cases.view_case"))
+        self.assertEqual(snapshot.lead_detective_case_ids, {self.led.pk})
+        self.assertEqual(snapshot.supervisor_case_ids, set())
+        self.assertEqual(snapshot.complainant_case_ids, {self.filed.pk})
+
+    def test_request_reads_permissions_once(self):
+        self.client.force_authenticate(user=User.objects.get(pk=self.detective.pk))
+        with self.settings(PERMISSION_QUERY_STATS=True):
+            r = self.client.get(reverse("front-modules-get"))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        # Every has_perm of FrontModulesGetView reads the same snapshot
+        self.assertEqual(r["X-Permission-Queries"], "1")
+
+    def test_group_change_is_seen_in_the_same_request(self):
+        token = _request_snapshots.set({})
+        try:
+            user = User.objects.get(pk=self.detective.pk)
+            self.assertTrue(get_permission_snapshot(user).has_perm("cases.investigate_on_case"))
+            user.groups.remove(Group.objects.get(name="Detectives"))
+            self.assertFalse(get_permission_snapshot(user).has_perm("cases.investigate_on_case"))
+        finally:
+            _request_snapshots.reset(token)
+
+
+class PermissionSnapshotCacheTests(PermissionSnapshotFixture, APITransactionTestCase):
+    """Shared cache behaviour, with committed changes"""
+
+    def setUp(self):
+        # A cache shared between processes; snapshots aren't cached in a per process LocMemCache
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        settings_override = self.settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tmp_dir,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+    def permission_queries(self):
+        self.client.force_authenticate(user=User.objects.get(pk=self.detective.pk))
+        with self.settings(PERMISSION_QUERY_STATS=True):
+            return self.client.get(reverse("front-modules-get"))["X-Permission-Queries"]
+
+    def test_per_process_cache_is_not_used(self):
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    get_permission_snapshot(self.detective)
+
+    def test_new_user_with_a_reused_id_gets_its_own_snapshot(self):
+        self.assertTrue(get_permission_snapshot(self.detective).has_perm("cases.jury_case"))
+        pk = self.detective.pk
+        self.detective.delete()
+        recruit = User.objects.create_user(pk=pk, username="recruit", password="password123")
+        self.assertFalse(get_permission_snapshot(recruit).has_perm("cases.jury_case"))
+
+    def test_warm_requests_read_no_permissions(self):
+        self.assertEqual(self.permission_queries(), "1")
+        self.assertEqual(self.permission_queries(), "0")
+
+        # Rank changes invalidate the cached snapshots
+        Group.objects.get(name="Detectives").permissions.add(Permission.objects.get(codename="view_case"))
+        self.assertEqual(self.permission_queries(), "1")
+        self.assertEqual(self.permission_queries(), "0")
+
+    def test_changes_are_not_cached_before_commit(self):
+        self.assertTrue(get_permission_snapshot(self.detective).has_perm("cases.investigate_on_case"))
+        try:
+            with transaction.atomic():
+                self.detective.groups.remove(Group.objects.get(name="Detectives"))
+                self.assertFalse(get_permission_snapshot(self.detective).has_perm("cases.investigate_on_case"))
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        self.assertTrue(get_permission_snapshot(self.detective).has_perm("cases.investigate_on_case"))
+
+    def test_cached_snapshot_follows_case_roles(self):
+        self.assertEqual(get_permission_snapshot(self.detective).supervisor_case_ids, set())
+        self.filed.supervisor = self.detective
+        self.filed.save()
+        self.assertEqual(get_permission_snapshot(self.detective).supervisor_case_ids, {self.filed.pk})
+
+    def test_cached_responses_follow_permissions_and_case_status(self):
+        def get(url_name, field):
+            self.client.force_authenticate(user=User.objects.get(pk=self.detective.pk))
+            return self.client.get(reverse(url_name)).json()[field]
+
+        def type_keys():
+            return {item["key"] for item in get("submission-type-list", "types")}
+
+        self.assertNotIn("AUTOPSY", get("front-modules-get", "modules"))
+        self.assertNotIn("INVESTIGATION_APPROVAL", type_keys())
+
+        self.detective.user_permissions.add(Permission.objects.get(codename="can_approve_bioevidence"))
+        self.assertIn("AUTOPSY", get("front-modules-get", "modules"))
+
+        self.led.status = Case.Status.OPEN_INVESTIGATION
+        self.led.save()
+        self.assertIn("INVESTIGATION_APPROVAL", type_keys())
+
+    def test_cached_modules_follow_superuser_flag(self):
+        officer = User.objects.create_user(username="officer", password="password123")
+
+        def modules():
+            self.client.force_authenticate(user=User.objects.get(pk=officer.pk))
+            return self.client.get(reverse("front-modules-get")).json()["modules"]
+
+        self.assertNotIn("ASSIGNED_CASES", modules())
+        User.objects.filter(pk=officer.pk).update(is_superuser=True)
+        self.assertIn("ASSIGNED_CASES", modules())
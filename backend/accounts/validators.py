@@ -4,6 +4,17 @@ import re
 
 IR_NID_10_DIGITS = re.compile(r"^\d{10}$")
 
+# Persian and Arabic-Indic digits
+_NID_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_NID_SEPARATORS = re.compile(r"[\s\-]+")
+
+
+def normalize_national_id(value) -> str:
+    """
+    Canonical stored form of a national id: Latin digits without spacing or dashes.
+    """
+    return _NID_SEPARATORS.sub("", str(value or "").translate(_NID_DIGITS))
+
 def validate_national_id(value: str) -> None:
     """
     Validates national id. Only accepts strings which exactly contain 10 digits.
@@ -7,3 +7,4 @@ admin.site.register(Complaint)
 admin.site.register(CrimeScene)
 admin.site.register(CaseSuspectLink)
 
+admin.site.register(CriminalRecord)
@@ -0,0 +1,39 @@
+"""
+Rebuild the materialized criminal records (`cases.CriminalRecord`) of every user
+that has ever been a suspect, from their `CaseSuspectLink` rows.
+
+The records are maintained on the write paths that change suspect links or case
+details; run this after importing data or changing those paths.
+"""
+from django.core.management.base import BaseCommand
+
+from cases.models import CaseSuspectLink, CriminalRecord
+from cases.services import refresh_criminal_records
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized criminal record of every suspect. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users rebuilt per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        user_ids = sorted(set(CaseSuspectLink.objects.values_list("user_id", flat=True)))
+
+        for start in range(0, len(user_ids), batch_size):
+            refresh_criminal_records(user_ids[start:start + batch_size])
+
+        # Users whose links were all deleted keep no record.
+        stale, _ = CriminalRecord.objects.exclude(
+            user_id__in=CaseSuspectLink.objects.values("user_id")
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(user_ids)} criminal record(s), removed {stale} stale record(s)."
+        ))
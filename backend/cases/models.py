@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Prefetch
 from django.contrib.auth.models import AbstractUser
 from core import settings
 from submissions.models import Submission
@@ -163,7 +164,69 @@ class CaseSuspectLink(models.Model):
 
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
-    
+
+
+def criminal_record_prefetch(lookup: str = "case_suspect_links") -> Prefetch:
+    """
+    Prefetch that attaches every suspect link of a user (with its case), ordered by case,
+    as `prefetched_criminal_record`. Used by the criminal record serializers.
+
+    :param lookup: Path to the user's `case_suspect_links`, e.g. "suspect_links__user__case_suspect_links"
+    """
+    return Prefetch(
+        lookup,
+        queryset=CaseSuspectLink.objects.select_related("case").order_by("case_id"),
+        to_attr="prefetched_criminal_record",
+    )
+
+
+def suspect_links_prefetch(lookup: str = "suspect_links") -> Prefetch:
+    """
+    Prefetch of a case's suspect links together with each suspect and their materialized `CriminalRecord`.
+
+    :param lookup: Path to the case's `suspect_links`, e.g. "case__suspect_links"
+    """
+    return Prefetch(
+        lookup,
+        queryset=CaseSuspectLink.objects.select_related("user__criminal_record"),
+    )
+
+
+class DurationInDays(models.Func):
+    """
+    Whole days of a duration expression, computed in the database (like `timedelta.days`).
+    """
+    output_field = models.IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # SQLite and MySQL represent durations as microseconds
+        return super().as_sql(
+            compiler, connection, template="CAST(%(expressions)s / 86400000000 AS INTEGER)", **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="CAST(EXTRACT(DAY FROM %(expressions)s) AS INTEGER)", **extra_context
+        )
+
+
+class CriminalRecord(models.Model):
+    """
+    Materialized criminal record of a user: the serialized list of every case they were a suspect in.
+    Rebuilt by `cases.services.refresh_criminal_records` whenever their suspect links or those cases change.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="criminal_record",
+    )
+    entries = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Serialized criminal record items, ordered by case.",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
 
 class CaseSubmissionLink(models.Model):
     class RelationType(models.TextChoices):
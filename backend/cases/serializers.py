@@ -1,10 +1,12 @@
 from typing import Any
 
+from django.db import transaction
 from rest_framework import serializers
-from .models import Complaint, CrimeScene, Case, CaseSubmissionLink, CaseSuspectLink, InvestigationResults
+from .models import Complaint, CrimeScene, Case, CaseSubmissionLink, CaseSuspectLink, InvestigationResults, CriminalRecord
 from accounts.models import User
 from accounts.serializers.fields import NationalIDField, PhoneNumberField
 from rest_framework.exceptions import PermissionDenied
+from django.core.exceptions import ValidationError as DjangoValidationError
 from drf_spectacular.utils import extend_schema_field
 
 # ---------------------------------------------------------------------
@@ -12,40 +14,44 @@ from drf_spectacular.utils import extend_schema_field
 # ---------------------------------------------------------------------
 
 class SuspectCriminalRecordItemSerializer(serializers.ModelSerializer):
-    case_id = serializers.IntegerField(source="id", read_only=True)
-    verdict_title = serializers.SerializerMethodField()
-    verdict_description = serializers.SerializerMethodField()
-    verdict_description = serializers.SerializerMethodField()
-    guilt_status = serializers.SerializerMethodField()
+    """
+    One case of a suspect's criminal record, serialized from the suspect's `CaseSuspectLink`.
+    """
+    case_id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(source="case.title", read_only=True)
+    description = serializers.CharField(source="case.description", read_only=True)
+    crime_datetime = serializers.DateTimeField(source="case.crime_datetime", read_only=True)
+    status = serializers.ChoiceField(source="case.status", choices=Case.Status.choices, read_only=True)
 
     class Meta:
-        model = Case
+        model = CaseSuspectLink
         fields = ["case_id", "title", "description", "crime_datetime", "status", "verdict_title", "verdict_description", "guilt_status"]
         read_only_fields = fields
 
-    def _get_suspect_link(self, obj: Case) -> CaseSuspectLink | None:
-        suspect_user_id = self.context.get("suspect_user_id")
-        if suspect_user_id is None:
-            return None
-        return CaseSuspectLink.objects.filter(case=obj, user_id=suspect_user_id).first()
 
-    def get_verdict_title(self, obj: Case):
-        suspect_link = self._get_suspect_link(obj)
-        if not suspect_link:
-            return None
-        return suspect_link.verdict_title
-    
-    def get_guilt_status(self, obj: Case):
-        suspect_link = self._get_suspect_link(obj)
-        if not suspect_link:
-            return None
-        return suspect_link.guilt_status
+def get_criminal_record_links(user: User) -> list[CaseSuspectLink]:
+    """
+    Suspect links of the user ordered by case. Uses `criminal_record_prefetch()` when applied.
+    """
+    prefetched = getattr(user, "prefetched_criminal_record", None)
+    if prefetched is not None:
+        return prefetched
+    return list(user.case_suspect_links.select_related("case").order_by("case_id"))
 
-    def get_verdict_description(self, obj: Case):
-        suspect_link = self._get_suspect_link(obj)
-        if not suspect_link:
-            return None
-        return suspect_link.verdict_description
+
+def get_criminal_record(user: User, context=None) -> list:
+    """
+    Serialized criminal record of the user. Served from the materialized `CriminalRecord`
+    when it exists, otherwise built from the suspect links.
+    """
+    try:
+        return user.criminal_record.entries
+    except CriminalRecord.DoesNotExist:
+        return SuspectCriminalRecordItemSerializer(
+            get_criminal_record_links(user),
+            many=True,
+            context=context or {},
+        ).data
 
 
 class UserBriefInfoSerializer(serializers.ModelSerializer):
@@ -63,12 +69,7 @@ class InvestigationSuspectSerializer(UserBriefInfoSerializer):
         read_only_fields = fields
 
     def get_criminal_record(self, obj: User) -> SuspectCriminalRecordItemSerializer:
-        cases = obj.suspect_cases.all().order_by("id")
-        return SuspectCriminalRecordItemSerializer(
-            cases,
-            many=True,
-            context={**self.context, "suspect_user_id": obj.id},
-        ).data
+        return get_criminal_record(obj, self.context)
 
 class SuspectInfoSerializer(UserBriefInfoSerializer):
     id = serializers.IntegerField(source="user.id", read_only=True)
@@ -93,12 +94,7 @@ class SuspectInfoSerializer(UserBriefInfoSerializer):
         read_only_fields = fields
 
     def get_criminal_record(self, obj: CaseSuspectLink) -> SuspectCriminalRecordItemSerializer:
-        cases = obj.user.suspect_cases.all().order_by("id")
-        return SuspectCriminalRecordItemSerializer(
-            cases,
-            many=True,
-            context={**self.context, "suspect_user_id": obj.user_id},
-        ).data
+        return get_criminal_record(obj.user, self.context)
 
 class IndexedErrorsListSerializer(serializers.ListSerializer):
     def run_validation(self, data=serializers.empty):
@@ -135,28 +131,48 @@ class IndexedErrorsListField(serializers.ListField):
 
 
 class NationalIDUsersListField(IndexedErrorsListField):
-    """Accept national IDs and return ordered, deduped User objects."""
+    """
+    Accept national IDs and return ordered, deduped User objects. The users are resolved with
+    one query for the whole list; unknown IDs are reported at their index.
+    """
 
     def __init__(self, **kwargs):
-        kwargs.setdefault("child", NationalIDField(should_exist=True))
+        kwargs.setdefault("child", NationalIDField())
         super().__init__(**kwargs)
 
+    def run_child_validation(self, data):
+        national_ids = {}
+        errors = {}
+        for idx, item in enumerate(data):
+            try:
+                national_ids[idx] = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[idx] = exc.detail
+
+        users_by_nid = {
+            user.national_id: user
+            for user in User.objects.filter(national_id__in=set(national_ids.values()))
+        } if national_ids else {}
+
+        for idx, national_id in national_ids.items():
+            if national_id not in users_by_nid:
+                errors[idx] = [self.child.error_messages["not_found"].format(value=national_id)]
+
+        if errors:
+            raise serializers.ValidationError({str(idx): errors[idx] for idx in sorted(errors)})
+        return [users_by_nid[national_ids[idx]] for idx in sorted(national_ids)]
+
     def to_internal_value(self, data):
-        values = super().to_internal_value(data)
+        users = super().to_internal_value(data)
 
         seen = set()
-        national_ids = []
-        for value in values:
-            if value in seen:
+        unique_users = []
+        for user in users:
+            if user.pk in seen:
                 continue
-            seen.add(value)
-            national_ids.append(value)
-
-        users_by_nid = {
-            user.national_id: user
-            for user in User.objects.filter(national_id__in=national_ids)
-        }
-        return [users_by_nid[nid] for nid in national_ids if nid in users_by_nid]
+            seen.add(user.pk)
+            unique_users.append(user)
+        return unique_users
 
 
 
@@ -255,14 +271,19 @@ class CaseStaffingSubmissionPayloadSerializer(serializers.ModelSerializer):
         return "Not Assigned" if obj.supervisor is None else (obj.supervisor.first_name + " " + obj.supervisor.last_name)
     
     def get_origin_submission_id(self, obj:Case) -> int:
-        link = obj.submission_links.filter(
-            relation_type=CaseSubmissionLink.RelationType.ORIGIN
-        ).select_related("submission").first()
+        # Iterate .all() so a prefetched `submission_links` is reused.
+        link = next(
+            (
+                link for link in obj.submission_links.all()
+                if link.relation_type == CaseSubmissionLink.RelationType.ORIGIN
+            ),
+            None,
+        )
 
         if not link:
             return None
 
-        return link.submission.id
+        return link.submission_id
 
 # ---------------------------------------------------------------------
 # Case list
@@ -393,9 +414,57 @@ class ComplainantCaseListSerializer(serializers.ModelSerializer):
 # Case update
 # ---------------------------------------------------------------------
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves values from `objects_by_pk` once `prefetch` filled it,
+    instead of running one query per value.
+    """
+    objects_by_pk = None
+
+    def _to_pk(self, data):
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def prefetch(self, values) -> None:
+        pks = set()
+        for value in values:
+            if isinstance(value, bool):
+                continue
+            try:
+                pks.add(self._to_pk(value))
+            except DjangoValidationError:
+                continue
+        self.objects_by_pk = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.objects_by_pk is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = self._to_pk(data)
+        except DjangoValidationError:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        obj = self.objects_by_pk.get(pk)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class SuspectUpdateListSerializer(IndexedErrorsListSerializer):
+    """
+    Resolves every `suspect_link` of the list in a single query before validating the items.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields["suspect_link"].prefetch(
+                item.get("suspect_link") for item in data if isinstance(item, dict)
+            )
+        return super().to_internal_value(data)
+
+
 class SuspectUpdateSerilizer(serializers.Serializer):
-    suspect_link = serializers.PrimaryKeyRelatedField(
-        queryset=CaseSuspectLink.objects.all(),
+    suspect_link = PrefetchedPrimaryKeyRelatedField(
+        queryset=CaseSuspectLink.objects.select_related("case", "user"),
         write_only=True
     )
     supervisor_score = serializers.IntegerField(
@@ -428,7 +497,7 @@ class SuspectUpdateSerilizer(serializers.Serializer):
         if (suspect_link.user.status == suspect_link.user.Status.WANTED) and (changing_score):
             raise serializers.ValidationError({"suspect_link" : "suspect is wanted and not interogated yet"})
         
-        if (case.lead_detective.id != user.id) and (case.supervisor.id != user.id):
+        if (case.lead_detective_id != user.id) and (case.supervisor_id != user.id):
             raise PermissionDenied("You should be the detective / supervisor of the case")
 
         if "supervisor_score" in attrs and case.supervisor_id != user.id:
@@ -459,7 +528,7 @@ class SuspectUpdateSerilizer(serializers.Serializer):
         return value
 
     class Meta:
-        list_serializer_class = IndexedErrorsListSerializer
+        list_serializer_class = SuspectUpdateListSerializer
 
 
 class CaseUpdateSerializer(serializers.ModelSerializer):
@@ -523,11 +592,14 @@ class CaseUpdateSerializer(serializers.ModelSerializer):
 
         return suspects
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         complainants = validated_data.pop("complainant_national_ids", None)
         witnesses = validated_data.pop("witnesses_national_ids", None)
         suspects = validated_data.pop("suspects", None)
 
+        record_changed = any(attr in validated_data for attr in ("title", "description"))
+        changed_fields = list(validated_data.keys())
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
@@ -536,7 +608,10 @@ class CaseUpdateSerializer(serializers.ModelSerializer):
         if witnesses is not None:
             instance.witnesses.set(witnesses)
 
-        if suspects is not None:
+        if suspects:
+            user: User = self.context["request"].user
+            links = []
+            users = []
             for s in suspects:
                 link: CaseSuspectLink = s["suspect_link"]
 
@@ -546,18 +621,26 @@ class CaseUpdateSerializer(serializers.ModelSerializer):
                 if "lead_detective_score" in s:
                     link.detective_score = s["lead_detective_score"]
                 elif "score" in s:
-                    user: User = self.context["request"].user
                     if instance.supervisor_id == user.id:
                         link.supervisor_score = s["score"]
                     if instance.lead_detective_id == user.id:
                         link.detective_score = s["score"]
-                
+
                 if "status" in s:
                     link.user.status = s["status"]
-                    link.user.save()
-                link.save()
+                    users.append(link.user)
+                links.append(link)
 
-        instance.save()
+            CaseSuspectLink.objects.bulk_update(links, ["supervisor_score", "detective_score"])
+            if users:
+                User.objects.bulk_update(users, ["status"])
+
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+
+        if record_changed:
+            from .services import refresh_case_criminal_records
+            refresh_case_criminal_records(instance)
 
         return instance
 
@@ -604,21 +687,71 @@ class CaseChargesSubmissionSerializer(CaseListSerializer):
 # ---------------------------------------------------------------------
 
 class GuiltAssesmentPayloadSerializer(serializers.Serializer):
-    guilty_suspects_ids = serializers.ListField(
-        child=serializers.PrimaryKeyRelatedField(
-            queryset=CaseSuspectLink.objects.all(),
-            write_only=True,
+    """
+    Validates the guilty suspect links against `context["case"]` with a single query.
+    """
+    guilty_suspects_ids = IndexedErrorsListField(
+        child=serializers.IntegerField(write_only=True),
+    )
+
+    def validate_guilty_suspects_ids(self, value: list[int]):
+        case: Case = self.context["case"]
+        case_link_ids = set(
+            CaseSuspectLink.objects.filter(case=case, pk__in=value).values_list("pk", flat=True)
         )
+        indexed_errors = {
+            str(i): [f"suspect id does not belong to this case: {sid}"]
+            for i, sid in enumerate(value)
+            if sid not in case_link_ids
+        }
+        if indexed_errors:
+            raise serializers.ValidationError(indexed_errors)
+        return value
+
+
+class VerdictItemSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField(help_text="ID of the suspect (user) to apply the verdict to.")
+    guilt_status = serializers.ChoiceField(
+        choices=[CaseSuspectLink.SuspectGuiltStatus.GUILTY, CaseSuspectLink.SuspectGuiltStatus.CLEARED],
+        help_text="Verdict: GUILTY or CLEARED. PENDING_ASSESSMENT is not allowed.",
     )
+    title = serializers.CharField(help_text="Short title for the verdict.")
+    description = serializers.CharField(help_text="Detailed description of the verdict.")
+
+    def validate_user_id(self, value: int):
+        suspect_links: dict[int, CaseSuspectLink] = self.context["suspect_links"]
+        if value not in suspect_links:
+            raise serializers.ValidationError(f"User with id {value} is not a suspect in this case.")
+        return value
+
+    class Meta:
+        list_serializer_class = IndexedErrorsListSerializer
+
+
+class CaseVerdictSerializer(serializers.Serializer):
+    """
+    Validates the jury verdicts of a case against `context["suspect_links"]`, a map of
+    user id to the case's `CaseSuspectLink`.
+    """
+    verdicts = VerdictItemSerializer(many=True, help_text="List of verdict objects, one per suspect.")
+
+    def validate_verdicts(self, value: list[dict]):
+        seen = set()
+        errors = {}
+        for i, verdict in enumerate(value):
+            if verdict["user_id"] in seen:
+                errors[str(i)] = {"user_id": "Duplicate verdict for this suspect."}
+            seen.add(verdict["user_id"])
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
 
     
 class MostWantedSerializer(serializers.ModelSerializer):
+    # Both are annotated by the `MostWanted` view queryset
     wanted_score = serializers.IntegerField(read_only=True)
-    reward_amount = serializers.SerializerMethodField()
+    reward_amount = serializers.IntegerField(read_only=True)
     class Meta:
         model = User
         fields = ["id", "username", "first_name", "last_name", "reward_amount", "wanted_score"]
         read_only_fields = fields
-    def get_reward_amount(self, obj) -> int:
-        mul = 20_000_000
-        return mul * obj.wanted_score
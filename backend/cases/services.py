@@ -1,9 +1,19 @@
-from .models import Case, CrimeScene, Complaint, CaseSubmissionLink
+from .models import Case, CrimeScene, Complaint, CaseSubmissionLink, CaseSuspectLink, CriminalRecord, criminal_record_prefetch
+from accounts.models import User
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Q
 from rest_framework.serializers import ValidationError
 from . import submissiontypes
 from submissions.service import create_submission
 
+MOST_WANTED_CACHE_KEY = "cases:most_wanted"
+# Wanted scores grow by the day, so the leaderboard also expires on its own
+MOST_WANTED_CACHE_TIMEOUT = 60 * 60
+MOST_WANTED_REWARD_PER_SCORE = 20_000_000
+
+FRONT_MODULES_CACHE_KEY = "cases:front_modules:{user}:{permissions_version}"
+
 @transaction.atomic
 def create_case_from_complaint(complaint: Complaint) -> Case:
     case = Case.objects.create(
@@ -54,4 +64,52 @@ def attach_submission_to_case(*, submission, case, relation_type=CaseSubmissionL
     )
     if not created and link.case_id != case.id:
         raise ValidationError("This submission is already linked to a different case.")
-    return link
\ No newline at end of file
+    return link
+
+def refresh_criminal_records(user_ids) -> None:
+    """
+    Rebuild the materialized `CriminalRecord` of the given users from their suspect links.
+    """
+    from .serializers import SuspectCriminalRecordItemSerializer, get_criminal_record_links
+
+    users = User.objects.filter(pk__in=list(user_ids)).prefetch_related(criminal_record_prefetch())
+    records = [
+        CriminalRecord(
+            user=user,
+            entries=SuspectCriminalRecordItemSerializer(get_criminal_record_links(user), many=True).data,
+        )
+        for user in users
+    ]
+    CriminalRecord.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["entries", "updated_at"],
+    )
+
+def refresh_case_criminal_records(case: Case, extra_user_ids=()) -> None:
+    """
+    Rebuild the criminal records of every suspect of the case, e.g. after its suspect links or
+    its status / title changed.
+
+    :param extra_user_ids: Users that are no longer suspects of the case but were before the change
+    """
+    user_ids = set(CaseSuspectLink.objects.filter(case=case).values_list("user_id", flat=True))
+    refresh_criminal_records(user_ids | set(extra_user_ids))
+
+def invalidate_most_wanted() -> None:
+    """
+    Drop the cached most wanted leaderboard. Called whenever suspect links or case crime levels change.
+    """
+    cache.delete(MOST_WANTED_CACHE_KEY)
+
+
+def get_listable_cases(user):
+    """
+    Cases `user` sees with full details in the case list: every case with `cases.view_case`,
+    otherwise the cases they lead or supervise. Complainants never get their own cases here.
+    """
+    queryset = Case.objects.all()
+    if not user.has_perm("cases.view_case"):
+        queryset = queryset.filter(Q(lead_detective=user) | Q(supervisor=user))
+    return queryset.exclude(complainants=user)
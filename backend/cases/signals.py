@@ -0,0 +1,56 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.permissions import bump_case_assignments_version
+
+from .models import Case, CaseSuspectLink
+from .services import invalidate_most_wanted
+
+
+@receiver([post_save, post_delete], sender=CaseSuspectLink)
+def suspect_link_changed(sender, **kwargs):
+    invalidate_most_wanted()
+
+
+# Fields deciding which cases users are assigned to, and what they may submit for them
+CASE_ASSIGNMENT_FIELDS = ("lead_detective", "supervisor", "status")
+
+
+@receiver(pre_save, sender=Case)
+def remember_case_assignments(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(CASE_ASSIGNMENT_FIELDS) & set(update_fields):
+        return
+    attnames = [Case._meta.get_field(name).attname for name in CASE_ASSIGNMENT_FIELDS]
+    previous = sender.objects.filter(pk=instance.pk).values_list(*attnames).first()
+    current = tuple(getattr(instance, attname) for attname in attnames)
+    if previous is None or previous[:2] != current[:2]:
+        instance._case_assignments_changed = True
+    else:
+        # Status changes matter only to the lead detective and supervisor of the case
+        instance._case_assignments_changed = previous[2] != current[2] and any(current[:2])
+
+
+@receiver(post_save, sender=Case)
+def case_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or "crime_level" in update_fields:
+        invalidate_most_wanted()
+    if created:
+        assignments_changed = instance.lead_detective_id is not None or instance.supervisor_id is not None
+    else:
+        assignments_changed = instance.__dict__.pop("_case_assignments_changed", False)
+    if assignments_changed:
+        bump_case_assignments_version()
+
+
+@receiver(post_delete, sender=Case)
+def case_deleted(sender, **kwargs):
+    invalidate_most_wanted()
+    bump_case_assignments_version()
+
+
+@receiver(m2m_changed, sender=Case.complainants.through)
+def case_complainants_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_case_assignments_version()
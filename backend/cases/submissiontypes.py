@@ -1,5 +1,5 @@
 from submissions.submissiontypes.classes import BaseSubmissionType
-from cases.models import Complaint, CrimeScene, CaseSubmissionLink, InvestigationResults, Case, CaseSuspectLink
+from cases.models import Complaint, CrimeScene, CaseSubmissionLink, InvestigationResults, Case, CaseSuspectLink, suspect_links_prefetch
 from cases.serializers import (
     ComplaintSerializer,
     ComplaintSerializer,
@@ -12,7 +12,8 @@ from cases.serializers import (
 from submissions.models import SubmissionStage, SubmissionActionType, Submission, SubmissionAction, SubmissionStatus
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from accounts.models import User
-from django.db.models import Q
+from accounts.permissions import get_permission_snapshot
+from django.db.models import Prefetch, Value, When, Case as DBCase
 
 class ComplaintSubmissionType(BaseSubmissionType["Complaint"]):
     type_key             = "COMPLAINT"
@@ -38,6 +39,10 @@ class ComplaintSubmissionType(BaseSubmissionType["Complaint"]):
         "complainant_national_ids": ["1111111111", "2222222222"],
     }
 
+    @classmethod
+    def get_target_queryset(cls):
+        return super().get_target_queryset().prefetch_related("complainants")
+
     @classmethod
     def handle_submission_action(cls, submission: Submission, action: SubmissionAction, context, **kwargs):
         from .services import attach_submission_to_case, create_case_from_complaint
@@ -152,6 +157,10 @@ class CrimeSceneSubmissionType(BaseSubmissionType["CrimeScene"]):
     }
     api_request_schema = CrimeSceneSerializer
 
+    @classmethod
+    def get_target_queryset(cls):
+        return super().get_target_queryset().prefetch_related("witnesses")
+
     @classmethod
     def on_submit(cls, submission: Submission):
         target = cls.get_object(submission.object_id)
@@ -224,6 +233,14 @@ class CaseStaffingSubmissionType(BaseSubmissionType["Case"]):
     }
     api_request_schema           = None
 
+    @classmethod
+    def get_target_queryset(cls):
+        return (
+            super().get_target_queryset()
+            .select_related("lead_detective", "supervisor")
+            .prefetch_related("submission_links")
+        )
+
     @classmethod
     def on_submit(cls, submission):
         SubmissionStage.objects.create(
@@ -324,6 +341,19 @@ class InvestigationResultsApprovalSubmissionType(BaseSubmissionType["Investigati
         ],
     }
     
+    @classmethod
+    def get_target_queryset(cls):
+        return (
+            super().get_target_queryset()
+            .select_related("case__lead_detective", "case__supervisor")
+            .prefetch_related(
+                "case__complainants",
+                "case__witnesses",
+                suspect_links_prefetch("case__suspect_links"),
+                Prefetch("suggested_suspects", queryset=User.objects.select_related("criminal_record")),
+            )
+        )
+
     @classmethod
     def on_submit(cls, submission):
         target = cls.get_object(submission.object_id)
@@ -338,18 +368,27 @@ class InvestigationResultsApprovalSubmissionType(BaseSubmissionType["Investigati
 
     @classmethod
     def handle_submission_action(cls, submission, action, context, **kwargs):
+        from .services import refresh_case_criminal_records, invalidate_most_wanted
         target = cls.get_object(submission.object_id)
         case = target.case
 
         if action.action_type == SubmissionActionType.APPROVE:
-            case.status = Case.Status.INTEROGATING_SUSPECTS
-            case.suspects.set(target.suggested_suspects.all())
-
-            for user in case.suspects.all():
-                user.status = user.Status.WANTED
-                user.save(update_fields=["status"])
+            suspect_links = CaseSuspectLink.objects.filter(case=case)
+            previous_suspect_ids = set(suspect_links.values_list("user_id", flat=True))
+            suspect_ids = {user.id for user in target.suggested_suspects.all()}
+
+            # Links of suspects that stay on the case are kept as is, so their `started_at` is preserved
+            suspect_links.exclude(user_id__in=suspect_ids).delete()
+            CaseSuspectLink.objects.bulk_create([
+                CaseSuspectLink(case=case, user_id=user_id)
+                for user_id in suspect_ids - previous_suspect_ids
+            ])
+            User.objects.filter(pk__in=suspect_ids).update(status=User.Status.WANTED)
 
-            case.save()
+            case.status = Case.Status.INTEROGATING_SUSPECTS
+            case.save(update_fields=["status"])
+            refresh_case_criminal_records(case, extra_user_ids=previous_suspect_ids)
+            invalidate_most_wanted()
 
             submission.status = SubmissionStatus.APPROVED
 
@@ -360,7 +399,10 @@ class InvestigationResultsApprovalSubmissionType(BaseSubmissionType["Investigati
 
     @classmethod
     def can_user_submit(cls, user):
-        return super().can_user_submit(user) and Case.objects.filter(lead_detective=user, status=Case.Status.OPEN_INVESTIGATION).exists()
+        if not super().can_user_submit(user):
+            return False
+        snapshot = get_permission_snapshot(user)
+        return snapshot.has_case_in_status(snapshot.lead_detective_case_ids, Case.Status.OPEN_INVESTIGATION)
 
 class GuiltAssesmentSubmissionType(BaseSubmissionType["Case"]):
     type_key             = "GUILT_ASSESMENT"
@@ -373,6 +415,18 @@ class GuiltAssesmentSubmissionType(BaseSubmissionType["Case"]):
         "case_id": 1
     }
 
+    @classmethod
+    def get_target_queryset(cls):
+        return (
+            super().get_target_queryset()
+            .select_related("lead_detective", "supervisor")
+            .prefetch_related(
+                "complainants",
+                "witnesses",
+                suspect_links_prefetch(),
+            )
+        )
+
     @classmethod
     def validate_submission_data(cls, data, context):
         case_id = data.get("case_id")
@@ -399,9 +453,11 @@ class GuiltAssesmentSubmissionType(BaseSubmissionType["Case"]):
     
     @classmethod
     def on_submit(cls, submission):
+        from .services import refresh_case_criminal_records
         target = cls.get_object(submission.object_id)
         target.status = target.Status.GUILT_ASSESMENT
         target.save()
+        refresh_case_criminal_records(target)
         
         SubmissionStage.objects.create(
             submission=submission,
@@ -422,21 +478,22 @@ class GuiltAssesmentSubmissionType(BaseSubmissionType["Case"]):
     
     @classmethod
     def handle_submission_action(cls, submission, action, context, **kwargs):
-        stage = SubmissionStage.objects.filter(submission=submission, order=submission.current_stage).first()
+        stage = submission.get_current_stage()
         target = cls.get_object(submission.object_id)
         from django.utils import timezone
+        from .services import refresh_case_criminal_records, invalidate_most_wanted
 
-        for s in target.suspect_links.all():
-            s: CaseSuspectLink
-            s.guilt_status = s.SuspectGuiltStatus.CLEARED
-            s.ended_at = timezone.now()
-            s.save()
+        suspect_links = CaseSuspectLink.objects.filter(case=target)
+        now = timezone.now()
 
         if stage.order == 0:
-            for sid in action.payload["guilty_suspects_ids"]:
-                link = CaseSuspectLink.objects.get(pk=sid)
-                link.guilt_status = CaseSuspectLink.SuspectGuiltStatus.GUILTY
-                link.save()
+            suspect_links.update(
+                guilt_status=DBCase(
+                    When(pk__in=action.payload["guilty_suspects_ids"], then=Value(CaseSuspectLink.SuspectGuiltStatus.GUILTY)),
+                    default=Value(CaseSuspectLink.SuspectGuiltStatus.CLEARED),
+                ),
+                ended_at=now,
+            )
             if target.crime_level != target.CrimeLevel.CRITICAL:
                 target.status = target.Status.TRIAL
                 target.save()
@@ -447,31 +504,32 @@ class GuiltAssesmentSubmissionType(BaseSubmissionType["Case"]):
                 submission.save()
         if stage.order == 1:
             if action.action_type == SubmissionActionType.REJECT:
-                for s in target.suspect_links.all():
-                    s: CaseSuspectLink
-                    s.guilt_status = s.SuspectGuiltStatus.PENDING_ASSESSMENT
-                    s.save()
+                suspect_links.update(guilt_status=CaseSuspectLink.SuspectGuiltStatus.PENDING_ASSESSMENT, ended_at=now)
                 submission.current_stage=0
                 submission.save()
             if action.action_type == SubmissionActionType.APPROVE:
+                suspect_links.update(guilt_status=CaseSuspectLink.SuspectGuiltStatus.CLEARED, ended_at=now)
                 target.status = target.Status.TRIAL
                 target.save()
                 submission.status = SubmissionStatus.APPROVED
                 submission.save()
 
+        refresh_case_criminal_records(target)
+        invalidate_most_wanted()
+
     @classmethod
     def validate_submission_action_payload(cls, submission, action_type, payload, context, **kwargs):
         target = cls.get_object(submission.object_id)
 
         if action_type == SubmissionActionType.ASSESS_GUILTS:
-            serializer = GuiltAssesmentPayloadSerializer(data=payload, context=context)
+            serializer = GuiltAssesmentPayloadSerializer(data=payload, context={**context, "case": target})
             serializer.is_valid(raise_exception=True)
-            for sid in payload["guilty_suspects_ids"]:
-                if CaseSuspectLink.objects.get(pk=sid).case.pk != target.pk:
-                    raise ValidationError(f"suspect id does not belong to this case: {sid}")
 
     
     @classmethod
     def can_user_submit(cls, user):
-        return super().can_user_submit(user) and Case.objects.filter(Q(lead_detective=user)|Q(supervisor=user)).filter(status=Case.Status.INTEROGATING_SUSPECTS).exists()
+        if not super().can_user_submit(user):
+            return False
+        snapshot = get_permission_snapshot(user)
+        return snapshot.has_case_in_status(snapshot.assigned_case_ids, Case.Status.INTEROGATING_SUSPECTS)
 
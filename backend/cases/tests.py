@@ -1,18 +1,26 @@
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
 from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.db.models import Subquery
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase
 from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
 
 from accounts.models import User
 from submissions.models import Submission, SubmissionActionType, SubmissionStatus
+from submissions.service import create_submission
 from evidence.models import OtherEvidence
 
-from .models import Case, CaseSubmissionLink, CaseSuspectLink
-from .submissiontypes import CaseStaffingSubmissionType 
+from .models import Case, CaseSubmissionLink, CaseSuspectLink, InvestigationResults
+from .serializers import NationalIDUsersListField
+from .submissiontypes import CaseStaffingSubmissionType, InvestigationResultsApprovalSubmissionType
 import json
 
 class CaseCreationTest(APITestCase):
@@ -776,6 +784,18 @@ class CaseCreationTest(APITestCase):
 
         # self.client.force_authenticate(self.u7)
 
+        res = self.send_submission_action(
+            SubmissionActionType.ASSESS_GUILTS,
+            {
+                "guilty_suspects_ids": [
+                    suspect_link_id_1,
+                    999999,
+                ]
+            },
+            guilt_assesment_submission.pk,
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
         res = self.send_submission_action(
             SubmissionActionType.ASSESS_GUILTS,
             {
@@ -786,6 +806,14 @@ class CaseCreationTest(APITestCase):
             guilt_assesment_submission.pk,
         )
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            CaseSuspectLink.objects.get(pk=suspect_link_id_1).guilt_status,
+            CaseSuspectLink.SuspectGuiltStatus.GUILTY,
+        )
+        self.assertEqual(
+            CaseSuspectLink.objects.get(pk=suspect_link_id_2).guilt_status,
+            CaseSuspectLink.SuspectGuiltStatus.CLEARED,
+        )
 
         self.client.force_authenticate(self.u5)
         res = self.get_cases()
@@ -811,6 +839,7 @@ class CaseCreationTest(APITestCase):
 
     def test_most_wanted(self):
         from .models import Case, CaseSuspectLink
+        cache.clear()
 
         now = timezone.now()
         older_than_threshold = now - timedelta(days=60)
@@ -900,6 +929,311 @@ class CaseCreationTest(APITestCase):
         # reward_amount is proportional to wanted_score for each entry
         for item in data:
             self.assertEqual(item["reward_amount"], item["wanted_score"] * 20_000_000)
+        # Score = days as a suspect * crime degree
+        self.assertEqual(data[0]["wanted_score"], 60 * 4)
+        self.assertEqual(data[1]["wanted_score"], 60 * 1)
+
+        # The cached leaderboard is dropped when a crime level changes
+        low_level_case.crime_level = Case.CrimeLevel.CRITICAL
+        low_level_case.save(update_fields=["crime_level"])
+        data = self.client.get(url, format="json").json()
+        self.assertEqual([item["wanted_score"] for item in data], [60 * 4, 60 * 4])
+
+class CaseListPaginationTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chief = User.objects.create_user(
+            username="chief",
+            password="pass12345",
+            national_id="7000000001",
+            phone_number="+989127000001",
+        )
+        cls.chief.user_permissions.add(Permission.objects.get(codename="view_case"))
+
+        for i in range(5):
+            Case.objects.create(
+                title=f"Case {i}",
+                description="description",
+                crime_datetime=timezone.now(),
+            )
+
+    def test_case_list_is_unpaginated_by_default(self):
+        self.client.force_authenticate(self.chief)
+        res = self.client.get(reverse("case-list"), format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.json(), list)
+        self.assertEqual(len(res.json()), 5)
+
+    def test_case_list_cursor_pagination(self):
+        self.client.force_authenticate(self.chief)
+        expected_ids = [case["id"] for case in self.client.get(reverse("case-list"), format="json").json()]
+
+        seen_ids = []
+        url = reverse("case-list") + "?page_size=2"
+        while url:
+            res = self.client.get(url, format="json")
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            page = res.json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen_ids += [case["id"] for case in page["results"]]
+            url = page["next"]
+
+        self.assertEqual(seen_ids, expected_ids)
+
+class CaseListQueryCountTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.chief = User.objects.create_user(
+            username="chief",
+            password="pass12345",
+            national_id="7100000001",
+            phone_number="+989127100001",
+        )
+        cls.chief.user_permissions.add(Permission.objects.get(codename="view_case"))
+        cls.suspect_count = 0
+
+    def create_cases_with_suspects(self, count):
+        for _ in range(count):
+            case = Case.objects.create(
+                title="Case",
+                description="description",
+                crime_datetime=timezone.now(),
+            )
+            for _ in range(2):
+                self.suspect_count += 1
+                suspect = User.objects.create_user(
+                    username=f"suspect{self.suspect_count}",
+                    password="pass12345",
+                    national_id=f"{7200000000 + self.suspect_count}",
+                    phone_number="+989127100002",
+                )
+                prior_case = Case.objects.create(
+                    title="Prior case",
+                    description="description",
+                    crime_datetime=timezone.now(),
+                    status=Case.Status.CLOSED,
+                )
+                CaseSuspectLink.objects.create(
+                    user=suspect,
+                    case=prior_case,
+                    guilt_status=CaseSuspectLink.SuspectGuiltStatus.GUILTY,
+                    verdict_title="Guilty",
+                )
+                CaseSuspectLink.objects.create(user=suspect, case=case)
+
+        # Links are created directly here, so materialize the records like a deployment would.
+        call_command("rebuild_criminal_records", stdout=StringIO())
+
+    def count_case_list_queries(self):
+        self.client.force_authenticate(User.objects.get(pk=self.chief.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("case-list"), format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.json(), len(ctx.captured_queries)
+
+    def test_case_list_criminal_records_query_count_is_constant(self):
+        self.create_cases_with_suspects(2)
+        _, queries_small = self.count_case_list_queries()
+
+        self.create_cases_with_suspects(4)
+        data, queries_large = self.count_case_list_queries()
+
+        self.assertEqual(queries_small, queries_large)
+
+        open_case = next(case for case in data if case["status"] != Case.Status.CLOSED)
+        record = open_case["suspects"][0]["criminal_record"]
+        self.assertEqual(len(record), 2)
+        prior = next(item for item in record if item["status"] == Case.Status.CLOSED)
+        self.assertEqual(prior["verdict_title"], "Guilty")
+        self.assertEqual(prior["guilt_status"], CaseSuspectLink.SuspectGuiltStatus.GUILTY)
+
+class CaseUpdateSuspectsQueryCountTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.detective = User.objects.create_user(
+            username="detective",
+            password="pass12345",
+            national_id="7300000001",
+            phone_number="+989127300001",
+        )
+        cls.supervisor = User.objects.create_user(
+            username="supervisor",
+            password="pass12345",
+            national_id="7300000002",
+            phone_number="+989127300002",
+        )
+        cls.case = Case.objects.create(
+            title="Interrogation case",
+            description="description",
+            crime_datetime=timezone.now(),
+            status=Case.Status.INTEROGATING_SUSPECTS,
+            lead_detective=cls.detective,
+            supervisor=cls.supervisor,
+        )
+        cls.links = []
+        for i in range(6):
+            suspect = User.objects.create_user(
+                username=f"interrogated{i}",
+                password="pass12345",
+                national_id=f"{7300000010 + i}",
+                phone_number="+989127300003",
+                status=User.Status.ARRESTED,
+            )
+            cls.links.append(CaseSuspectLink.objects.create(user=suspect, case=cls.case))
+
+    def patch_suspects(self, links, score):
+        self.client.force_authenticate(self.detective)
+        payload = {
+            "suspects": [
+                {"suspect_link": link.pk, "score": score, "status": User.Status.FREE}
+                for link in links
+            ]
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(reverse("case-update", kwargs={"pk": self.case.pk}), data=payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_suspect_updates_query_count_is_constant(self):
+        queries_small = self.patch_suspects(self.links[:2], 5)
+        queries_large = self.patch_suspects(self.links, 7)
+        self.assertEqual(queries_small, queries_large)
+
+        for link in self.links:
+            link.refresh_from_db()
+            self.assertEqual(link.detective_score, 7)
+            self.assertEqual(link.supervisor_score, 1)
+            self.assertEqual(link.user.status, User.Status.FREE)
+
+    def test_unknown_suspect_link_is_rejected_by_index(self):
+        self.client.force_authenticate(self.detective)
+        payload = {"suspects": [{"suspect_link": self.links[0].pk, "score": 5}, {"suspect_link": 999999, "score": 5}]}
+        res = self.client.patch(reverse("case-update", kwargs={"pk": self.case.pk}), data=payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("suspect_link", res.json()["suspects"]["1"])
+
+
+class NationalIDUsersListFieldTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.witnesses = [
+            User.objects.create_user(
+                username=f"witness{i}",
+                password="pass12345",
+                national_id=f"{7500000000 + i}",
+                phone_number="+989127500000",
+            )
+            for i in range(30)
+        ]
+
+    def resolve(self, national_ids):
+        with CaptureQueriesContext(connection) as ctx:
+            users = NationalIDUsersListField().run_validation(national_ids)
+        return users, len(ctx.captured_queries)
+
+    def test_all_ids_are_resolved_with_one_query(self):
+        national_ids = [user.national_id for user in self.witnesses]
+        # Persian digits and spacing are normalized, duplicates dropped
+        national_ids.append(" ۷۵۰۰ ۰۰۰۰۰۰ ")
+
+        users, queries = self.resolve(national_ids)
+        self.assertEqual(users, self.witnesses)
+        self.assertEqual(queries, 1)
+
+    def test_missing_ids_are_reported_at_their_index(self):
+        with self.assertRaises(ValidationError) as ctx:
+            NationalIDUsersListField().run_validation([
+                self.witnesses[0].national_id, "7599999999", "12345", self.witnesses[1].national_id, "7599999998",
+            ])
+        self.assertEqual(set(ctx.exception.detail), {"1", "2", "4"})
+        self.assertIn("7599999999", str(ctx.exception.detail["1"][0]))
+
+
+class InvestigationApprovalQueryCountTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.detective = User.objects.create_user(
+            username="detective",
+            password="pass12345",
+            national_id="7400000001",
+            phone_number="+989127400001",
+        )
+        cls.supervisor = User.objects.create_user(
+            username="supervisor",
+            password="pass12345",
+            national_id="7400000002",
+            phone_number="+989127400002",
+        )
+        cls.suspect_count = 0
+
+    def create_suspects(self, count):
+        users = []
+        for _ in range(count):
+            self.suspect_count += 1
+            users.append(User.objects.create_user(
+                username=f"suggested{self.suspect_count}",
+                password="pass12345",
+                national_id=f"{7400000010 + self.suspect_count}",
+                phone_number="+989127400003",
+            ))
+        return users
+
+    def create_investigation(self, suspects):
+        case = Case.objects.create(
+            title="Investigation",
+            description="description",
+            crime_datetime=timezone.now(),
+            status=Case.Status.OPEN_INVESTIGATION,
+            lead_detective=self.detective,
+            supervisor=self.supervisor,
+        )
+        results = InvestigationResults.objects.create(case=case)
+        results.suggested_suspects.set(suspects)
+        submission = create_submission(
+            submission_type_cls=InvestigationResultsApprovalSubmissionType,
+            target=results,
+            created_by=self.detective,
+        )
+        return case, submission
+
+    def approve(self, submission):
+        self.client.force_authenticate(User.objects.get(pk=self.supervisor.pk))
+        url = reverse("submission-action-list-create", kwargs={"pk": submission.pk})
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(url, data={"action_type": SubmissionActionType.APPROVE, "payload": {}}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(ctx.captured_queries)
+
+    def test_approve_query_count_is_constant(self):
+        small_case, small_submission = self.create_investigation(self.create_suspects(2))
+        large_suspects = self.create_suspects(8)
+        large_case, large_submission = self.create_investigation(large_suspects)
+
+        queries_small = self.approve(small_submission)
+        queries_large = self.approve(large_submission)
+        self.assertEqual(queries_small, queries_large)
+
+        self.assertEqual(
+            set(large_case.suspect_links.values_list("user_id", flat=True)),
+            {user.id for user in large_suspects},
+        )
+        self.assertFalse(
+            User.objects.filter(pk__in=[user.id for user in large_suspects]).exclude(status=User.Status.WANTED).exists()
+        )
+
+    def test_approve_keeps_existing_links(self):
+        kept, dropped, added = self.create_suspects(3)
+        case, submission = self.create_investigation([kept, added])
+        started_at = timezone.now() - timedelta(days=40)
+        kept_link = CaseSuspectLink.objects.create(case=case, user=kept)
+        CaseSuspectLink.objects.filter(pk=kept_link.pk).update(started_at=started_at)
+        CaseSuspectLink.objects.create(case=case, user=dropped)
+
+        self.approve(submission)
+
+        self.assertEqual(set(case.suspect_links.values_list("user_id", flat=True)), {kept.id, added.id})
+        self.assertEqual(CaseSuspectLink.objects.get(pk=kept_link.pk).started_at, started_at)
+
 
 class VerdictTest(APITestCase):
     @classmethod
@@ -1071,18 +1405,18 @@ class VerdictTest(APITestCase):
     def test_verdict_post_verdicts_required(self):
         self.client.force_authenticate(self.jury_user)
         url = self._verdict_url(self.case.pk)
-        with self.assertRaises(ValueError) as ctx:
-            self.client.post(url, data={}, format="json")
-        self.assertIn("verdicts", str(ctx.exception))
+        response = self.client.post(url, data={}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("verdicts", response.json())
 
     def test_verdict_post_verdicts_must_be_list(self):
         self.client.force_authenticate(self.jury_user)
         url = self._verdict_url(self.case.pk)
-        with self.assertRaises(ValueError) as ctx:
-            self.client.post(
-                url, data={"verdicts": "not a list"}, format="json"
-            )
-        self.assertIn("verdicts", str(ctx.exception))
+        response = self.client.post(
+            url, data={"verdicts": "not a list"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("verdicts", response.json())
 
     def test_verdict_post_user_must_be_suspect_in_case(self):
         outsider = User.objects.create_user(
@@ -1103,9 +1437,9 @@ class VerdictTest(APITestCase):
                 }
             ]
         }
-        with self.assertRaises(ValueError) as ctx:
-            self.client.post(url, data=payload, format="json")
-        self.assertIn("not a suspect", str(ctx.exception))
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("not a suspect", str(response.json()["verdicts"]["0"]["user_id"]))
 
     def test_verdict_post_invalid_guilt_status_rejected(self):
         self.client.force_authenticate(self.jury_user)
@@ -1120,9 +1454,37 @@ class VerdictTest(APITestCase):
                 }
             ]
         }
-        with self.assertRaises(ValueError) as ctx:
-            self.client.post(url, data=payload, format="json")
-        self.assertIn("guilt_status", str(ctx.exception))
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("guilt_status", response.json()["verdicts"]["0"])
+
+    def test_verdict_post_invalid_item_applies_nothing(self):
+        self.client.force_authenticate(self.jury_user)
+        url = self._verdict_url(self.case.pk)
+        payload = {
+            "verdicts": [
+                {
+                    "user_id": self.suspect_one.id,
+                    "guilt_status": CaseSuspectLink.SuspectGuiltStatus.GUILTY,
+                    "title": "Guilty",
+                    "description": "First suspect guilty.",
+                },
+                {
+                    "user_id": self.suspect_two.id,
+                    "guilt_status": CaseSuspectLink.SuspectGuiltStatus.CLEARED,
+                    "title": "Cleared",
+                },
+            ]
+        }
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.json()["verdicts"].keys()), ["1"])
+        self.assertIn("description", response.json()["verdicts"]["1"])
+
+        self.link_one.refresh_from_db()
+        self.case.refresh_from_db()
+        self.assertEqual(self.link_one.guilt_status, CaseSuspectLink.SuspectGuiltStatus.PENDING_ASSESSMENT)
+        self.assertEqual(self.case.status, Case.Status.TRIAL)
 
     # def test_verdict_post_title_and_description_required(self):
     #     self.client.force_authenticate(self.jury_user)
@@ -1,4 +1,8 @@
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max, Value, When, IntegerField, Case as DBCase
+from django.db.models.functions import Coalesce, Now
 from django.shortcuts import get_object_or_404
 from rest_framework import generics,status
 from rest_framework.views import APIView
@@ -11,12 +15,20 @@ from evidence.serializers import EvidencePolymorphicSerializer
 from .models import Case
 from evidence.models import Evidence  
 
-from .models import Case, CaseSubmissionLink, CaseSuspectLink
+from .models import Case, CaseSubmissionLink, CaseSuspectLink, DurationInDays, suspect_links_prefetch
+from .services import (refresh_case_criminal_records,
+                       invalidate_most_wanted,
+                       get_listable_cases,
+                       FRONT_MODULES_CACHE_KEY,
+                       MOST_WANTED_CACHE_KEY,
+                       MOST_WANTED_CACHE_TIMEOUT,
+                       MOST_WANTED_REWARD_PER_SCORE)
 from .serializers import (CaseListSerializer, 
                           ComplainantCaseListSerializer,
                             CaseUpdateSerializer,
                               CaseLinkedSubmissionSerializer,
-                              MostWantedSerializer)
+                              MostWantedSerializer,
+                              CaseVerdictSerializer)
 from evidence.models import Evidence
 from evidence.serializers import EvidencePolymorphicSerializer
 
@@ -24,6 +36,9 @@ from investigation.serializers import DetectiveBoardSerializer
 from investigation.permissions import IsDetectiveBoardOwner
 from investigation.models import DetectiveBoard
 from accounts.models import User
+from accounts.permissions import get_permissions_version, user_cache_key, versioned_cache_usable
+from submissions.models import current_stage_prefetch
+from core.pagination import CreatedAtCursorPagination, IdCursorPagination
 from django.utils import timezone
 from datetime import timedelta
 
@@ -102,23 +117,17 @@ case_list_example = {
 class CaseListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CaseListSerializer
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = (
-            Case.objects
-            .select_related("lead_detective", "supervisor")
-            .prefetch_related("complainants")
-        )
-
-        # Complainants never receive the full-detail payload from this endpoint.
-        if user.has_perm("cases.view_case"):
-            return queryset.exclude(complainants=user).distinct().order_by("-id")
-
         return (
-            queryset
-            .filter(Q(lead_detective=user) | Q(supervisor=user))
-            .exclude(complainants=user)
+            get_listable_cases(self.request.user)
+            .select_related("lead_detective", "supervisor")
+            .prefetch_related(
+                "complainants",
+                "witnesses",
+                suspect_links_prefetch(),
+            )
             .distinct()
             .order_by("-id")
         )
@@ -157,6 +166,7 @@ class CaseListView(generics.ListAPIView):
 class ComplainantCaseListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ComplainantCaseListSerializer
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -237,6 +247,15 @@ class CaseUpdateView(AssignedCaseAccessMixin, generics.RetrieveUpdateAPIView):
     )
     http_method_names = ["get", "patch"]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            return queryset.prefetch_related(
+                "witnesses",
+                suspect_links_prefetch(),
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.request.method == "GET":
             return CaseListSerializer
@@ -283,19 +302,13 @@ class CaseUpdateView(AssignedCaseAccessMixin, generics.RetrieveUpdateAPIView):
 class CaseEvidenceListView(AssignedCaseAccessMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = EvidencePolymorphicSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         case = self.get_case()
         return (
             Evidence.objects
             .filter(case_id=case.id)
-            .select_related(
-                "witnessevidence",
-                "bioevidence",
-                "vehicleevidence",
-                "identityevidence",
-                "otherevidence",
-            )
             .order_by("-created_at")
         )
 
@@ -337,7 +350,10 @@ class CaseSubmissionListView(AssignedCaseAccessMixin, generics.ListAPIView):
             CaseSubmissionLink.objects
             .filter(case_id=case.id)
             .select_related("submission", "submission__created_by")
-            .prefetch_related("submission__actions_history", "submission__stages")
+            .prefetch_related(
+                "submission__actions_history",
+                current_stage_prefetch("submission__stages"),
+            )
             .order_by("-submission__created_at")
             .distinct()
         )
@@ -439,7 +455,19 @@ class FrontModulesGetView(APIView):
         if (user is None) or (not user.is_authenticated):
             return Response({"modules":[]})
 
+        if not versioned_cache_usable():
+            return Response({"modules":self.get_modules(user)})
+
+        # Modules only depend on permissions (and the superuser flag, part of the user key), so the
+        # cached list is dropped with the permissions version
+        cache_key = FRONT_MODULES_CACHE_KEY.format(user=user_cache_key(user), permissions_version=get_permissions_version())
+        items = cache.get(cache_key)
+        if items is None:
+            items = self.get_modules(user)
+            cache.set(cache_key, items, settings.API_CACHE_TIMEOUT)
+        return Response({"modules":items})
 
+    def get_modules(self, user):
         items = []
 
         if user.has_perm("cases.investigate_on_case") or user.has_perm("cases.supervise_case") or user.has_perm("cases.view_case"):
@@ -454,11 +482,12 @@ class FrontModulesGetView(APIView):
         items.append("COMPLAINANT_CASES")
         items.append("PROFILE")
 
-        return Response({"modules":items})
+        return items
     
 class GetTrialCases(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CaseListSerializer
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -469,7 +498,11 @@ class GetTrialCases(generics.ListAPIView):
             Case.objects
             .filter(status=Case.Status.TRIAL)
             .select_related("lead_detective", "supervisor")
-            .prefetch_related("complainants", "witnesses", "suspect_links__user")
+            .prefetch_related(
+                "complainants",
+                "witnesses",
+                suspect_links_prefetch(),
+            )
             .order_by("-id")
         )
 
@@ -479,6 +512,7 @@ class GetTrialCases(generics.ListAPIView):
     description=(
         "Returns a list of suspects ordered by a 'wanted score' calculated based on the severity of their alleged crimes and the duration they've been suspects. "
         "Only suspects who have been investigated for at least 30 days are included. "
+        "At most the top 50 suspects are returned. The leaderboard is cached and refreshed whenever suspect links or case crime levels change."
     ),
     responses=MostWantedSerializer(many=True),
     request=None,
@@ -511,41 +545,39 @@ class GetTrialCases(generics.ListAPIView):
 class MostWanted(generics.ListAPIView):
     serializer_class = MostWantedSerializer
     permission_classes = [AllowAny]
+    # Size of the leaderboard
+    limit = 50
 
     def get_queryset(self):
-        from django.db.models import (ExpressionWrapper, F, Max, DurationField,Case as DBCase,When, Value,IntegerField)
-        from django.db.models.functions import Now, Coalesce, Extract
-        from .models import Case
         threshold = timezone.now() - timedelta(days=30)
-        users = User.objects.filter(
-            case_suspect_links__started_at__lt=threshold,
-        ).annotate(
-            max_duration=Max(
-                ExpressionWrapper(
-                    Coalesce(F('case_suspect_links__ended_at'), Now()) - F('case_suspect_links__started_at'),
-                    output_field=DurationField()
-                )
-            ),
-            max_degree=Max(
-                DBCase(
-                    When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_1, then=Value(1)),
-                    When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_2, then=Value(2)),
-                    When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_3, then=Value(3)),
-                    When(case_suspect_links__case__crime_level=Case.CrimeLevel.CRITICAL, then=Value(4)),
-                    output_field=IntegerField(),
-                )
+        degree = DBCase(
+            When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_1, then=Value(1)),
+            When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_2, then=Value(2)),
+            When(case_suspect_links__case__crime_level=Case.CrimeLevel.LEVEL_3, then=Value(3)),
+            When(case_suspect_links__case__crime_level=Case.CrimeLevel.CRITICAL, then=Value(4)),
+            output_field=IntegerField(),
+        )
+        return (
+            User.objects.filter(
+                case_suspect_links__started_at__lt=threshold,
+            ).annotate(
+                max_days=Max(DurationInDays(
+                    Coalesce(F('case_suspect_links__ended_at'), Now()) - F('case_suspect_links__started_at')
+                )),
+                max_degree=Max(degree),
+            ).annotate(
+                wanted_score=Coalesce(F("max_days"), 0) * Coalesce(F("max_degree"), 0),
+                reward_amount=F("wanted_score") * MOST_WANTED_REWARD_PER_SCORE,
             )
+            .order_by("-wanted_score", "id")[:self.limit]
         )
 
-        users_list = list(users)
-        for user in users_list:
-            max_days = user.max_duration.days if user.max_duration else 0
-            degree = user.max_degree if user.max_degree else 0
-            user.wanted_score = max_days * degree
-
-        
-        users_list.sort(key=lambda u: u.wanted_score, reverse=True)
-        return users_list
+    def list(self, request, *args, **kwargs):
+        data = cache.get(MOST_WANTED_CACHE_KEY)
+        if data is None:
+            data = list(self.get_serializer(self.get_queryset(), many=True).data)
+            cache.set(MOST_WANTED_CACHE_KEY, data, MOST_WANTED_CACHE_TIMEOUT)
+        return Response(data)
 
 @extend_schema_view(
     post=extend_schema(
@@ -558,26 +590,7 @@ class MostWanted(generics.ListAPIView):
             "`title` and `description` are required for each verdict. "
             "On success, the suspect link is updated and `ended_at` is set."
         ),
-        request=inline_serializer(
-            name="VerdictRequest",
-            fields={
-                "verdicts": serializers.ListField(
-                    child=inline_serializer(
-                        name="VerdictItem",
-                        fields={
-                            "user_id": serializers.IntegerField(help_text="ID of the suspect (user) to apply the verdict to."),
-                            "guilt_status": serializers.ChoiceField(
-                                choices=[CaseSuspectLink.SuspectGuiltStatus.GUILTY, CaseSuspectLink.SuspectGuiltStatus.CLEARED],
-                                help_text="Verdict: GUILTY or CLEARED. PENDING_ASSESSMENT is not allowed.",
-                            ),
-                            "title": serializers.CharField(help_text="Short title for the verdict."),
-                            "description": serializers.CharField(help_text="Detailed description of the verdict."),
-                        },
-                    ),
-                    help_text="List of verdict objects, one per suspect.",
-                ),
-            },
-        ),
+        request=CaseVerdictSerializer,
         responses={
             200: inline_serializer(
                 name="VerdictSuccessResponse",
@@ -585,7 +598,7 @@ class MostWanted(generics.ListAPIView):
             ),
             403: {"description": "Only users with jury permission can submit verdicts."},
             404: {"description": "Case not found."},
-            400: {"description": "Invalid payload: verdicts required as list, valid user_id/guilt_status/title/description per item."},
+            400: {"description": "Invalid payload: verdicts required as list, valid user_id/guilt_status/title/description per item. Item errors are keyed by their index."},
         },
         examples=[
             OpenApiExample(
@@ -626,38 +639,31 @@ class CaseVerdictView(APIView):
         if not user.has_perm("cases.jury_case"):
             raise PermissionDenied("Only users with jury permission can submit verdicts.")
         
-        users = case.suspects.filter(case_suspect_links__case=case, case_suspect_links__guilt_status=CaseSuspectLink.SuspectGuiltStatus.GUILTY)
-        verdicts = request.data.get("verdicts")
-        if verdicts is None or not isinstance(verdicts, list):
-            raise ValueError("verdicts field is required and should be a list of verdict objects.")
-        
-        for verdict in verdicts:
-            user_id = verdict.get("user_id")
-            
-            if not User.objects.filter(id=user_id, case_suspect_links__case=case).exists():
-                raise ValueError(f"User with id {user_id} is not a suspect in this case.")
-            
-            user = User.objects.get(id=user_id)
-            suspect_link = CaseSuspectLink.objects.get(user=user, case=case)
-            guilt_status = verdict.get("guilt_status")
-            title = verdict.get("title")
-            description = verdict.get("description")
-
-
-            if guilt_status not in CaseSuspectLink.SuspectGuiltStatus.values or guilt_status == CaseSuspectLink.SuspectGuiltStatus.PENDING_ASSESSMENT:
-                raise ValueError(f"Invalid guilt_status: {guilt_status} should be one of 'GUILTY' or 'CLEARED'.")
-            
-            if title is None or description is None:
-                raise ValueError("Both title and description are required for the verdict.")
-
-
-            suspect_link.guilt_status = guilt_status
-            suspect_link.verdict_title = title
-            suspect_link.verdict_description = description
-            suspect_link.ended_at = timezone.now()
-            suspect_link.save()
-        
-        case.status = case.Status.CLOSED
-        case.save()
+        suspect_links = {link.user_id: link for link in case.suspect_links.all()}
+        serializer = CaseVerdictSerializer(
+            data=request.data,
+            context={"request": request, "suspect_links": suspect_links},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        now = timezone.now()
+        updated_links = []
+        for verdict in serializer.validated_data["verdicts"]:
+            suspect_link = suspect_links[verdict["user_id"]]
+            suspect_link.guilt_status = verdict["guilt_status"]
+            suspect_link.verdict_title = verdict["title"]
+            suspect_link.verdict_description = verdict["description"]
+            suspect_link.ended_at = now
+            updated_links.append(suspect_link)
+
+        with transaction.atomic():
+            CaseSuspectLink.objects.bulk_update(
+                updated_links,
+                ["guilt_status", "verdict_title", "verdict_description", "ended_at"],
+            )
+            case.status = case.Status.CLOSED
+            case.save(update_fields=["status"])
+            refresh_case_criminal_records(case)
+        invalidate_most_wanted()
 
         return Response({"detail": "Verdicts submitted successfully."}, status=status.HTTP_200_OK)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class CoreConfig(AppConfig):
+    name = "core"
+
+    def ready(self):
+        from .views import invalidate_schema_cache
+
+        # Deploys run migrate, so the schema of the previous release is dropped there
+        post_migrate.connect(invalidate_schema_cache, sender=self)
@@ -0,0 +1,46 @@
+"""
+`CACHE_URL` parsing, in the spirit of `DATABASE_URL`:
+
+- `redis://host:6379/1`, `rediss://...`: Redis, shared by every worker (production)
+- `fakeredis://`: in-process Redis emulation from the `fakeredis` package (tests)
+- `file:///path/to/dir`: files in a directory, shared by the workers of one host (local)
+- `db://table_name`: a table of the default database, e.g. the local SQLite file
+  (create it with `manage.py createcachetable`)
+- `locmem://`: memory of the current process
+- `dummy://`: no caching
+"""
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "fakeredis": "django.core.cache.backends.redis.RedisCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "db": "django.core.cache.backends.db.DatabaseCache",
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def cache_config(url: str, key_prefix: str = "") -> dict:
+    """The `CACHES` entry described by `url`."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unsupported CACHE_URL scheme {scheme!r}, expected one of {', '.join(BACKENDS)}")
+
+    config = {"BACKEND": BACKENDS[scheme], "KEY_PREFIX": key_prefix}
+    if scheme in ("redis", "rediss"):
+        config["LOCATION"] = url
+    elif scheme == "fakeredis":
+        import fakeredis
+
+        config["LOCATION"] = "redis://localhost:6379/0"
+        config["OPTIONS"] = {"connection_class": fakeredis.FakeConnection}
+    elif scheme == "file":
+        config["LOCATION"] = parts.path
+    elif scheme == "db":
+        config["LOCATION"] = parts.netloc or parts.path.lstrip("/")
+    elif scheme == "locmem":
+        config["LOCATION"] = parts.netloc
+    return config
@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Keyset pagination that is only applied when the client asks for it by sending
+    `cursor` or `page_size`. Without them the endpoint keeps returning a plain list.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CreatedAtCursorPagination(OptionalCursorPagination):
+    ordering = ("-created_at", "-id")
+
+
+class IdCursorPagination(OptionalCursorPagination):
+    ordering = "-id"
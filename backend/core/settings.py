@@ -10,10 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 from dotenv import load_dotenv
+from core.cache import cache_config
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,12 +61,14 @@ INSTALLED_APPS = [
 
 #Your Apps
 INSTALLED_APPS += [
+    'core',
     'accounts',
     'cases',
     'evidence',
     'submissions',
     'investigation',
-    'payments'
+    'payments',
+    'search',
 ]
 
 
@@ -75,6 +80,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.PermissionSnapshotMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -110,6 +116,28 @@ DATABASES = {
 }
 
 
+# Cache
+# Selected by CACHE_URL (see core.cache): Redis in production, a directory shared by the local
+# workers otherwise. Tests get a fresh in-process cache, fakeredis when it is installed.
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+
+if TESTING:
+    CACHE_URL = os.environ.get("TEST_CACHE_URL") or ("fakeredis://" if find_spec("fakeredis") else "locmem://")
+else:
+    CACHE_URL = os.environ.get("CACHE_URL") or f"file://{BASE_DIR / '.cache'}"
+
+CACHES = {
+    "default": cache_config(CACHE_URL, key_prefix=os.environ.get("CACHE_KEY_PREFIX") or "wp"),
+}
+
+# Seconds per user API responses (front modules, submission types) stay cached. They are keyed by
+# the permissions and case assignments versions, so changes are seen right away.
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", 60 * 10))
+
+# Keep the generated OpenAPI schema in the cache until the next migrate (core.views)
+SCHEMA_CACHE = (os.environ.get("SCHEMA_CACHE") or str(not DEBUG)).lower() == "true"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -156,6 +184,27 @@ WHITENOISE_STATIC_PREFIX = STATIC_URL
 MEDIA_URL = FORCE_SCRIPT_NAME + "/media/" if FORCE_SCRIPT_NAME else "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Chunked evidence uploads (see evidence.services)
+# Partially uploaded files live here until they are attached to an evidence
+EVIDENCE_UPLOAD_DIR = os.environ.get("EVIDENCE_UPLOAD_DIR") or os.path.join(BASE_DIR, 'uploads')
+EVIDENCE_UPLOAD_MAX_SIZE = int(os.environ.get("EVIDENCE_UPLOAD_MAX_SIZE", 2 * 1024 ** 3))
+EVIDENCE_UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("EVIDENCE_UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 ** 2))
+
+# Thumbnail / medium variants of bio evidence images are generated by this many background threads.
+# 0 generates them in the request, right after the image is committed.
+EVIDENCE_IMAGE_VARIANT_WORKERS = int(os.environ.get("EVIDENCE_IMAGE_VARIANT_WORKERS", 2))
+
+# Evidence media is served by `api/evidence/media/` after checking case access (see evidence.views).
+# "django" streams the file from the app, "x-accel-redirect" (nginx) and "x-sendfile" (apache) hand
+# the transfer to the web server; nginx needs an `internal` location at EVIDENCE_MEDIA_ACCEL_PREFIX
+# aliasing MEDIA_ROOT.
+EVIDENCE_MEDIA_URL = (FORCE_SCRIPT_NAME or "") + "/api/evidence/media/"
+EVIDENCE_MEDIA_SERVE_MODE = os.environ.get("EVIDENCE_MEDIA_SERVE_MODE", "django").lower()
+EVIDENCE_MEDIA_ACCEL_PREFIX = os.environ.get("EVIDENCE_MEDIA_ACCEL_PREFIX", "/protected-media/")
+# Evidence responses sign their media URLs for the requesting user, as `<img src>` can't send the
+# JWT. A signed URL stays valid between one and two of these periods (seconds).
+EVIDENCE_MEDIA_URL_MAX_AGE = int(os.environ.get("EVIDENCE_MEDIA_URL_MAX_AGE", 30 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -302,3 +351,12 @@ LOGGING = {
 
 
 AUTH_USER_MODEL = 'accounts.User'
+
+# Permission checks read one snapshot per request (accounts.permissions)
+AUTHENTICATION_BACKENDS = ["accounts.backends.PermissionSnapshotBackend"]
+
+# Snapshots are shared between processes through the cache, invalidated by version bumps
+PERMISSION_SNAPSHOT_CACHE_TIMEOUT = int(os.environ.get("PERMISSION_SNAPSHOT_CACHE_TIMEOUT", 60 * 60))
+
+# Count the permission queries of every request, logged and sent as X-Permission-Queries
+PERMISSION_QUERY_STATS = os.environ.get("PERMISSION_QUERY_STATS", "False").lower() == "true"
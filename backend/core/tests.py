@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .cache import cache_config
+from .views import CachedSpectacularAPIView, invalidate_schema_cache
+
+
+class CacheConfigTests(SimpleTestCase):
+    def test_backends_are_selected_by_scheme(self):
+        self.assertEqual(cache_config("redis://redis:6379/1", key_prefix="wp"), {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "KEY_PREFIX": "wp",
+            "LOCATION": "redis://redis:6379/1",
+        })
+        self.assertEqual(cache_config("file:///var/tmp/wp-cache")["LOCATION"], "/var/tmp/wp-cache")
+        self.assertEqual(cache_config("db://api_cache")["BACKEND"], "django.core.cache.backends.db.DatabaseCache")
+        self.assertEqual(cache_config("db://api_cache")["LOCATION"], "api_cache")
+        self.assertEqual(cache_config("locmem://")["BACKEND"], "django.core.cache.backends.locmem.LocMemCache")
+
+    def test_unknown_scheme_is_rejected(self):
+        with self.assertRaises(ValueError):
+            cache_config("memcached://localhost:11211")
+
+
+@override_settings(SCHEMA_CACHE=True)
+class SchemaCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_schema_is_generated_once_until_migrate(self):
+        self.assertEqual(self.client.get(reverse("schema")).status_code, 200)
+
+        get_schema = mock.patch.object(
+            CachedSpectacularAPIView.generator_class, "get_schema", side_effect=AssertionError("regenerated"),
+        )
+        with get_schema:
+            response = self.client.get(reverse("schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("paths", response.json())
+
+        invalidate_schema_cache()
+        with get_schema, self.assertRaisesMessage(AssertionError, "regenerated"):
+            self.client.get(reverse("schema"))
@@ -2,9 +2,10 @@ from django.contrib import admin
 from django.http import HttpResponse
 from django.urls import path, include
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
 from . import settings
 from cases.views import FrontModulesGetView
+from .views import CachedSpectacularAPIView
 
 def health_check(request):
     return HttpResponse("OK", status=200)
@@ -12,7 +13,7 @@ def health_check(request):
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", CachedSpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
     path('api/auth/', include("accounts.urls")),
@@ -21,6 +22,7 @@ urlpatterns = [
     path("api/front-modules/", FrontModulesGetView.as_view(), name="front-modules-get"),
     path('api/submission/', include("submissions.urls")),
     path('api/payments/', include("payments.urls")),
+    path('api/search/', include("search.urls")),
     path(settings.ADMIN_URL, admin.site.urls),
 ]
 
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.response import Response
+
+SCHEMA_GENERATION_KEY = "core:schema_generation"
+SCHEMA_CACHE_KEY = "core:schema:{generation}:{version}:{lang}"
+
+
+def invalidate_schema_cache(**kwargs):
+    cache.set(SCHEMA_GENERATION_KEY, time.time_ns(), None)
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    `SpectacularAPIView` generating the schema once per release: it's kept in the cache until
+    the next `migrate` (see `CoreConfig`). Disabled with `SCHEMA_CACHE=False`, the default in DEBUG.
+    """
+
+    def _get_schema_response(self, request):
+        if not settings.SCHEMA_CACHE:
+            return super()._get_schema_response(request)
+
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        key = SCHEMA_CACHE_KEY.format(
+            generation=cache.get(SCHEMA_GENERATION_KEY, 0),
+            version=version or "",
+            lang=translation.get_language(),
+        )
+        schema = cache.get(key)
+        if schema is None:
+            generator = self.generator_class(urlconf=self.urlconf, api_version=version, patterns=self.patterns)
+            schema = generator.get_schema(request=request, public=self.serve_public)
+            cache.set(key, schema, None)
+        return Response(
+            data=schema,
+            headers={"Content-Disposition": f'inline; filename="{self._get_filename(request, version)}"'},
+        )
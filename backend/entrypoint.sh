@@ -9,6 +9,8 @@ collect_static() {
 migrate() {
     echo "Running database migrations..."
     python manage.py migrate --noinput
+    # Only creates a table when CACHE_URL uses the database (db://)
+    python manage.py createcachetable
     echo "Database migrations completed successfully!"
 }
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Evidence, WitnessEvidence, BioEvidence, VehicleEvidence, IdentityEvidence, BioEvidenceImage, OtherEvidence
+from .models import Evidence, WitnessEvidence, BioEvidence, VehicleEvidence, IdentityEvidence, BioEvidenceImage, OtherEvidence, StoredBlob
 
 @admin.register(Evidence)
 class EvidenceAdmin(admin.ModelAdmin):
@@ -90,3 +90,13 @@ class OtherEvidenceAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description')
     list_filter = ('created_at',)
 
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'ref_count', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
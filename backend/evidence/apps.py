@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EvidenceConfig(AppConfig):
     name = "evidence"
+
+    def ready(self):
+        import evidence.signals
+
+        post_migrate.connect(evidence.signals.evidence_app_migrated, sender=self)
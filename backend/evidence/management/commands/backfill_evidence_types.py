@@ -0,0 +1,25 @@
+"""
+Fill `Evidence.evidence_type` for evidence rows recorded before the column existed,
+by checking which subtype table holds each row.
+
+New evidence gets its type on save; run this once after deploying the column.
+"""
+from django.core.management.base import BaseCommand
+
+from evidence.models import Evidence, EVIDENCE_TYPE_MODELS
+
+
+class Command(BaseCommand):
+    help = "Backfill the evidence_type discriminator of existing evidence. Idempotent."
+
+    def handle(self, *args, **options):
+        total = 0
+        for evidence_type, model in EVIDENCE_TYPE_MODELS.items():
+            updated = Evidence.objects.filter(
+                evidence_type__isnull=True,
+                pk__in=model.objects.values("pk"),
+            ).update(evidence_type=evidence_type)
+            total += updated
+            self.stdout.write(f"{model.__name__}: {updated}")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} evidence row(s)."))
@@ -0,0 +1,45 @@
+"""
+Fill the normalized plate / serial number columns of vehicle evidence recorded before they
+existed (or after changing `normalize_vehicle_number`), so the vehicle lookup finds them.
+
+Vehicles get their normalized numbers on save; run this once after deploying the columns.
+"""
+from django.core.management.base import BaseCommand
+
+from evidence.models import VehicleEvidence, normalize_vehicle_number
+
+
+class Command(BaseCommand):
+    help = "Backfill the normalized plate and serial numbers of vehicle evidence. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of vehicles updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fields = ["plate_number_normalized", "serial_number_normalized"]
+        changed = []
+        total = 0
+
+        vehicles = VehicleEvidence.objects.only("pk", "plate_number", "serial_number", *fields)
+        for vehicle in vehicles.iterator(chunk_size=batch_size):
+            plate = normalize_vehicle_number(vehicle.plate_number)
+            serial = normalize_vehicle_number(vehicle.serial_number)
+            if (plate, serial) == (vehicle.plate_number_normalized, vehicle.serial_number_normalized):
+                continue
+            vehicle.plate_number_normalized = plate
+            vehicle.serial_number_normalized = serial
+            changed.append(vehicle)
+            if len(changed) >= batch_size:
+                total += VehicleEvidence.objects.bulk_update(changed, fields)
+                changed = []
+
+        if changed:
+            total += VehicleEvidence.objects.bulk_update(changed, fields)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} vehicle evidence row(s)."))
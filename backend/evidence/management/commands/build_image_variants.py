@@ -0,0 +1,38 @@
+"""
+Generate the thumbnail / medium variants of bio evidence images that don't have them yet,
+e.g. images uploaded before the variants existed or whose background generation failed.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from evidence.models import BioEvidenceImage
+from evidence.services import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generate missing variants of bio evidence images. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate the variants of every image, not only the missing ones.",
+        )
+
+    def handle(self, *args, **options):
+        images = BioEvidenceImage.objects.all()
+        if not options["all"]:
+            images = images.filter(
+                Q(thumbnail__isnull=True) | Q(thumbnail="") | Q(medium__isnull=True) | Q(medium="")
+            )
+
+        done, failed = 0, 0
+        for image_id in images.values_list("pk", flat=True).iterator():
+            try:
+                generate_image_variants(image_id)
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Image {image_id}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants of {done} image(s), {failed} failed."))
@@ -0,0 +1,36 @@
+"""
+Delete chunked evidence uploads (and their temporary files) that were not used
+for an evidence within the given time, e.g. abandoned or never finished uploads.
+
+Meant to be run periodically (cron).
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from evidence.models import EvidenceUpload
+from evidence.services import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete evidence uploads that were not touched for the given number of hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-hours",
+            type=int,
+            default=24,
+            help="Uploads not updated for this many hours are deleted.",
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(hours=options["older_than_hours"])
+        uploads = EvidenceUpload.objects.filter(updated_at__lt=threshold)
+
+        count = 0
+        for upload in uploads.iterator():
+            discard_upload(upload)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} stale upload(s)."))
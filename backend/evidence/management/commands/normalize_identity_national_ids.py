@@ -0,0 +1,43 @@
+"""
+Rewrite the `details.national_id` of identity evidence recorded before it was normalized on
+save, so the identity lookup matches it whatever digits or separators were typed.
+
+Identities get a normalized national id on save; run this once after deploying.
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.validators import normalize_national_id
+from evidence.models import IdentityEvidence
+
+
+class Command(BaseCommand):
+    help = "Normalize the national ids stored in identity evidence details. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of identities updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        changed = []
+        total = 0
+
+        identities = IdentityEvidence.objects.filter(details__has_key="national_id").only("pk", "details")
+        for identity in identities.iterator(chunk_size=batch_size):
+            national_id = identity.details.get("national_id")
+            if not isinstance(national_id, (str, int)) or normalize_national_id(national_id) == national_id:
+                continue
+            identity.details["national_id"] = normalize_national_id(national_id)
+            changed.append(identity)
+            if len(changed) >= batch_size:
+                total += IdentityEvidence.objects.bulk_update(changed, ["details"])
+                changed = []
+
+        if changed:
+            total += IdentityEvidence.objects.bulk_update(changed, ["details"])
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized {total} identity national id(s)."))
@@ -1,12 +1,29 @@
+import re
+import uuid
+
 from django.db import models
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
 from core import settings
 from django.core.exceptions import ValidationError
+from accounts.validators import normalize_national_id
+from .storage import ContentAddressedFileField, ContentAddressedImageField, get_evidence_media_storage
 
 class Evidence(models.Model):
     """
     Parent model for all evidence types.
     Implements requirements from Section 3.4.
     """
+    class EvidenceType(models.TextChoices):
+        WITNESS = "witness", "Witness"
+        BIO = "bio", "Bio"
+        VEHICLE = "vehicle", "Vehicle"
+        IDENTITY = "identity", "Identity"
+        OTHER = "other", "Other"
+
+    # Discriminator value written to `evidence_type` by each subtype
+    EVIDENCE_TYPE = None
+
     # Relation to the Case app
     case = models.ForeignKey(
         'cases.Case', 
@@ -27,18 +44,47 @@ class Evidence(models.Model):
     description = models.TextField(verbose_name=("Description"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=("Date Recorded"))
 
+    # Which subtype table holds the rest of this evidence, so reads don't have to probe every one of them
+    evidence_type = models.CharField(
+        max_length=16,
+        choices=EvidenceType.choices,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name=("Evidence Type")
+    )
+
     def __str__(self):
         return f"{self.title} ({self.get_evidence_type_display()})"
 
+    def save(self, *args, **kwargs):
+        if self.EVIDENCE_TYPE is not None:
+            self.evidence_type = self.EVIDENCE_TYPE
+        super().save(*args, **kwargs)
+
     def get_evidence_type_display(self):
         """
         Helper method to identify evidence type in Admin/UI.
         """
-        if hasattr(self, 'witnessevidence'): return 'Witness'
-        if hasattr(self, 'bioevidence'): return 'Bio'
-        if hasattr(self, 'vehicleevidence'): return 'Vehicle'
-        if hasattr(self, 'identityevidence'): return 'Identity'
-        return 'Other'
+        if self.evidence_type is None:
+            return self.EvidenceType.OTHER.label
+        return self.EvidenceType(self.evidence_type).label
+
+    def get_subtype(self) -> "Evidence | None":
+        """
+        Returns the subtype instance of this evidence (e.g. its `BioEvidence`) with one query,
+        or None if it has no subtype.
+        """
+        model = EVIDENCE_TYPE_MODELS.get(self.evidence_type)
+        if model is None:
+            return None
+        if isinstance(self, model):
+            return self
+        try:
+            return getattr(self, model._meta.model_name)
+        except model.DoesNotExist:
+            return None
 
 
 class WitnessEvidence(Evidence):
@@ -46,8 +92,11 @@ class WitnessEvidence(Evidence):
     Implements Section 1.3.4: Transcript of witness statements, 
     local reports, or media files.
     """
-    media_file = models.FileField(
+    EVIDENCE_TYPE = Evidence.EvidenceType.WITNESS
+
+    media_file = ContentAddressedFileField(
         upload_to='evidence/witness/', 
+        storage=get_evidence_media_storage,
         null=True, 
         blank=True
     )
@@ -67,6 +116,7 @@ class BioEvidence(Evidence):
     Implements Section 2.3.4: Biological evidence.
     Refactored to support multiple images via BioEvidenceImage model.
     """
+    EVIDENCE_TYPE = Evidence.EvidenceType.BIO
 
     coroner_result = models.TextField(
         null=True, 
@@ -94,8 +144,25 @@ class BioEvidenceImage(models.Model): # TODO: should approve by Coroner
         related_name='images'
     )
 
-    image = models.ImageField(
-        upload_to='evidence/bio/'
+    image = ContentAddressedImageField(
+        upload_to='evidence/bio/',
+        storage=get_evidence_media_storage
+    )
+
+    # Downscaled copies of `image`, generated in the background (see `evidence.services`)
+    thumbnail = ContentAddressedImageField(
+        upload_to='evidence/bio/thumbnails/',
+        storage=get_evidence_media_storage,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    medium = ContentAddressedImageField(
+        upload_to='evidence/bio/medium/',
+        storage=get_evidence_media_storage,
+        null=True,
+        blank=True,
+        editable=False
     )
 
     caption = models.CharField(
@@ -111,10 +178,31 @@ class BioEvidenceImage(models.Model): # TODO: should approve by Coroner
         verbose_name_plural = ("Bio Evidence Images")
 
 
+# Persian and Arabic-Indic digits, and Arabic forms of letters that have a Persian form
+_VEHICLE_NUMBER_TRANSLATION = str.maketrans(
+    "۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩يكة",
+    "01234567890123456789یکه",
+)
+# Spacing and separators people put between the parts of a plate / VIN
+_VEHICLE_NUMBER_SEPARATORS = re.compile(r"[\s\-_./\u200c\u200e\u200f]+")
+
+
+def normalize_vehicle_number(value: str | None) -> str | None:
+    """
+    Canonical form of a license plate or VIN used for lookups: ASCII digits, no spacing or
+    separators, upper case Latin letters.
+    """
+    if not value:
+        return None
+    return _VEHICLE_NUMBER_SEPARATORS.sub("", value.translate(_VEHICLE_NUMBER_TRANSLATION)).upper() or None
+
+
 class VehicleEvidence(Evidence):
     """
     Implements Section 3.3.4: Vehicle details found at the scene.
     """
+    EVIDENCE_TYPE = Evidence.EvidenceType.VEHICLE
+
     model_name = models.CharField(max_length=100, verbose_name=("Car Model"))
     color = models.CharField(max_length=50, verbose_name=("Color"))
     
@@ -133,9 +221,50 @@ class VehicleEvidence(Evidence):
         verbose_name=("Serial Number (VIN)")
     )
 
+    # `normalize_vehicle_number` of the fields above, used for cross-case lookups
+    plate_number_normalized = models.CharField(
+        max_length=20,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=("Normalized License Plate")
+    )
+    serial_number_normalized = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=("Normalized Serial Number")
+    )
+
     class Meta:
         verbose_name = ("Vehicle Evidence")
         verbose_name_plural = ("Vehicle Evidences")
+        # Pattern ops keep the indexes usable for prefix (LIKE 'x%') lookups on PostgreSQL
+        indexes = [
+            models.Index(
+                fields=["plate_number_normalized"],
+                name="vehicle_plate_norm_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            models.Index(
+                fields=["serial_number_normalized"],
+                name="vehicle_serial_norm_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.plate_number_normalized = normalize_vehicle_number(self.plate_number)
+        self.serial_number_normalized = normalize_vehicle_number(self.serial_number)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            if "plate_number" in update_fields:
+                update_fields = {*update_fields, "plate_number_normalized"}
+            if "serial_number" in update_fields:
+                update_fields = {*update_fields, "serial_number_normalized"}
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
 
     def clean(self):
         """
@@ -152,11 +281,20 @@ class VehicleEvidence(Evidence):
                 ("Vehicle must have at least a license plate or a serial number.")
             )
         
+def identity_detail(key: str) -> Cast:
+    """
+    `IdentityEvidence.details[key]` as text, so it is compared as plain text instead of JSON.
+    """
+    return Cast(KeyTextTransform(key, "details"), models.TextField())
+
+
 class IdentityEvidence(Evidence):
     """
     Implements Section 4.3.4: Identity documents found.
     Uses Key-Value storage for flexibility.
     """
+    EVIDENCE_TYPE = Evidence.EvidenceType.IDENTITY
+
     full_name = models.CharField(
         max_length=255, 
         verbose_name=("Owner Full Name")
@@ -169,11 +307,88 @@ class IdentityEvidence(Evidence):
         verbose_name=("Details (Key-Value)")
     )
 
+    # The most queried detail keys, copied by the database into indexed generated columns
+    # (`details_<key>`). Other keys are narrowed down by the GIN index on `details` on PostgreSQL
+    # (see evidence.services.filter_identity_details).
+    INDEXED_DETAIL_KEYS = ("national_id", "father_name")
+
+    details_national_id = models.GeneratedField(
+        expression=identity_detail("national_id"),
+        output_field=models.TextField(),
+        db_persist=True,
+        db_index=True,
+    )
+    details_father_name = models.GeneratedField(
+        expression=identity_detail("father_name"),
+        output_field=models.TextField(),
+        db_persist=True,
+        db_index=True,
+    )
+
     class Meta:
         verbose_name = ("Identity Evidence")
         verbose_name_plural = ("Identity Evidences")
 
+    def save(self, *args, **kwargs):
+        # Stored like `User.national_id`, so lookups and user links compare the same form
+        if isinstance(self.details, dict) and isinstance(self.details.get("national_id"), (str, int)):
+            self.details["national_id"] = normalize_national_id(self.details["national_id"])
+        super().save(*args, **kwargs)
+
 class OtherEvidence(Evidence):
+    EVIDENCE_TYPE = Evidence.EvidenceType.OTHER
+
     class Meta:
         verbose_name = ("Other Evidence")
         verbose_name_plural = ("Other Evidences")
+
+
+class EvidenceUpload(models.Model):
+    """
+    A resumable chunked upload of an evidence media file.
+    Chunks are appended to a temporary file (see `evidence.services`) which is moved into
+    the evidence's file field once the whole file arrived and its checksum matched.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='evidence_uploads'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total size of the file in bytes.")
+    checksum = models.CharField(
+        max_length=64,
+        help_text="Expected SHA-256 hex digest of the whole file."
+    )
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    is_complete = models.BooleanField(
+        default=False,
+        help_text="Set once every byte arrived and the checksum was verified."
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = ("Evidence Upload")
+        verbose_name_plural = ("Evidence Uploads")
+
+
+class StoredBlob(models.Model):
+    """
+    Reference count of a file kept by `evidence.storage.ContentAddressedStorage`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = ("Stored Blob")
+        verbose_name_plural = ("Stored Blobs")
+
+
+EVIDENCE_TYPE_MODELS: dict[str, type[Evidence]] = {
+    model.EVIDENCE_TYPE: model
+    for model in (WitnessEvidence, BioEvidence, VehicleEvidence, IdentityEvidence, OtherEvidence)
+}
@@ -1,5 +1,8 @@
+from django.db.models import Q
 from rest_framework import permissions
 
+from accounts.permissions import get_permission_snapshot
+
 
 class IsRecorderOrDjangoModelPermissions(permissions.DjangoModelPermissions):
 
@@ -18,3 +21,32 @@ class IsRecorderOrDjangoModelPermissions(permissions.DjangoModelPermissions):
             return True
         
         return super().has_object_permission(request, view, obj)
+
+
+def can_access_case(user, case) -> bool:
+    """
+    Whether `user` may see the evidence of `case`: users with the `cases.view_case` permission,
+    the case's complainants and its lead detective / supervisor.
+    """
+    if not user or not user.is_authenticated:
+        return False
+
+    if user.has_perm('cases.view_case', case):
+        return True
+
+    if user.id in (case.lead_detective_id, case.supervisor_id):
+        return True
+
+    return case.pk in get_permission_snapshot(user).complainant_case_ids
+
+
+def filter_visible_evidence(queryset, user):
+    """
+    Narrow `queryset` to the evidence `user` sees in the evidence lists: everything with
+    `evidence.view_evidence`, otherwise what they recorded and the evidence of the cases they
+    lead or supervise.
+    """
+    if user.has_perm('evidence.view_evidence'):
+        return queryset
+
+    return queryset.filter(Q(recorder=user) | Q(case__lead_detective=user) | Q(case__supervisor=user))
@@ -1,53 +1,179 @@
+import os
+from urllib.parse import urlencode
+
+from django.db.models import Manager
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from .models import *
+from django.conf import settings
 from cases.models import Case
+from cases.serializers import UserBriefInfoSerializer
+from accounts.models import User
+from accounts.validators import normalize_national_id
 from submissions.service import create_submission
+from .services import consume_upload, sign_media_name
+from .permissions import can_access_case
 
 
 class BaseEvidenceSerializer(serializers.ModelSerializer):
+    @classmethod
+    def get_subtype_queryset(cls):
+        """
+        Queryset used to load the evidences of this serializer's type when listing them.
+        Override to prefetch the relations the serializer renders.
+        """
+        return cls.Meta.model._default_manager.all()
+
     def validate_case(self, value: Case):
         request = self.context.get('request')
 
-        if request and not request.user and not request.user.is_authenticated:
+        if not request or not request.user.is_authenticated:
             raise PermissionDenied("Authentication required.")
-        
-        user = request.user
 
-        if user.has_perm('cases.view_case', value):
-            return value
-        
-        if Case.objects.filter(id=value.id, complainants__in=[user]).exists():
-            return value
+        if not can_access_case(request.user, value):
+            raise PermissionDenied("You do not have permission to this case.")
+        return value
+
+
+def validate_upload_size(file):
+    if file.size > settings.EVIDENCE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            f"File is too large; at most {settings.EVIDENCE_UPLOAD_MAX_SIZE} bytes are allowed."
+        )
+
+
+class EvidenceUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(
+        source="received_bytes",
+        read_only=True,
+        help_text="Number of bytes received so far; the next chunk starts here.",
+    )
+
+    class Meta:
+        model = EvidenceUpload
+        fields = ["id", "filename", "size", "checksum", "offset", "is_complete", "created_at"]
+        read_only_fields = ["id", "offset", "is_complete", "created_at"]
+
+    def validate_filename(self, value: str):
+        value = os.path.basename(value)
+        if not value:
+            raise serializers.ValidationError("Invalid file name.")
+        return value
+
+    def validate_size(self, value: int):
+        if value <= 0:
+            raise serializers.ValidationError("Size should be positive.")
+        if value > settings.EVIDENCE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"File is too large; at most {settings.EVIDENCE_UPLOAD_MAX_SIZE} bytes are allowed."
+            )
+        return value
+
+    def validate_checksum(self, value: str):
+        value = value.lower()
+        if len(value) != 64 or any(c not in "0123456789abcdef" for c in value):
+            raise serializers.ValidationError("Should be a SHA-256 hex digest.")
+        return value
+
+
+@extend_schema_field(OpenApiTypes.UUID)
+class SignedMediaUrlMixin:
+    """
+    Renders the media URL signed for the requesting user (`sign_media_name`), so it can be used
+    where the JWT isn't sent, e.g. `<img src>`.
+    """
+    def to_representation(self, value):
+        url = super().to_representation(value)
+        request = self.context.get("request")
+        if not url or request is None or not request.user.is_authenticated:
+            return url
+        return f"{url}?{urlencode(sign_media_name(value.name, request.user.pk))}"
+
+
+class EvidenceMediaFileField(SignedMediaUrlMixin, serializers.FileField):
+    pass
 
-        if (value.lead_detective.id == user.id) or (value.supervisor.id == user.id):
-            return value
-        raise PermissionDenied("You do not have permission to this case.")
+
+class EvidenceMediaImageField(SignedMediaUrlMixin, serializers.ImageField):
+    pass
+
+
+class EvidenceUploadField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts the id of a completed chunked upload of the requesting user.
+    """
+    def get_queryset(self):
+        return EvidenceUpload.objects.filter(created_by=self.context["request"].user, is_complete=True)
 
 
 class WitnessEvidenceSerializer(BaseEvidenceSerializer):
-    media_file = serializers.FileField(required=False)
+    media_file = EvidenceMediaFileField(required=False, validators=[validate_upload_size])
+    media_upload = EvidenceUploadField(
+        required=False,
+        write_only=True,
+        help_text="Id of a completed chunked upload to use as `media_file`.",
+    )
     class Meta:
         model = WitnessEvidence
         fields = "__all__"
         read_only_fields = ['recorder']
 
+    def validate(self, attrs):
+        if attrs.get("media_file") and attrs.get("media_upload"):
+            raise serializers.ValidationError({"media_upload": "Send either media_file or media_upload, not both."})
+        return attrs
+
+    def create(self, validated_data):
+        media_upload = validated_data.pop("media_upload", None)
+        evidence = super().create(validated_data)
+        if media_upload is not None:
+            consume_upload(media_upload, evidence.media_file)
+            evidence.save(update_fields=["media_file"])
+        return evidence
+
+    def update(self, instance, validated_data):
+        media_upload = validated_data.pop("media_upload", None)
+        if media_upload is not None:
+            consume_upload(media_upload, instance.media_file)
+        return super().update(instance, validated_data)
+
 
 
 class BioEvidenceImageSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField()
+    image = EvidenceMediaImageField()
+    thumbnail = EvidenceMediaImageField(
+        read_only=True,
+        help_text="Small variant of the image for listings; null until it is generated.",
+    )
+    medium = EvidenceMediaImageField(
+        read_only=True,
+        help_text="Medium size variant of the image; null until it is generated.",
+    )
     class Meta:
         model = BioEvidenceImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'thumbnail', 'medium', 'uploaded_at']
         
 
 class BioEvidenceSerializer(BaseEvidenceSerializer):
 
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(max_length=1000000, allow_empty_file=False, use_url=False),
+        child=serializers.ImageField(
+            max_length=1000000,
+            allow_empty_file=False,
+            use_url=False,
+            validators=[validate_upload_size],
+        ),
         write_only=True,
         required=False
     )
+    image_uploads = serializers.ListField(
+        child=EvidenceUploadField(),
+        write_only=True,
+        required=False,
+        help_text="Ids of completed chunked uploads to add as images.",
+    )
 
     images = BioEvidenceImageSerializer(many=True, read_only=True)
 
@@ -56,10 +182,15 @@ class BioEvidenceSerializer(BaseEvidenceSerializer):
         fields = "__all__"
         read_only_fields = ['recorder', 'coroner_result', 'is_verified']
 
+    @classmethod
+    def get_subtype_queryset(cls):
+        return super().get_subtype_queryset().prefetch_related("images")
+
     def create(self, validated_data):
         from .submissiontypes import BioEvidenceSubmissionType
 
         uploaded_images = validated_data.pop('uploaded_images', [])
+        image_uploads = validated_data.pop('image_uploads', [])
         bio_evidence = super().create(validated_data)
         create_submission(
             submission_type_cls=BioEvidenceSubmissionType,
@@ -70,12 +201,17 @@ class BioEvidenceSerializer(BaseEvidenceSerializer):
         for image in uploaded_images:
             BioEvidenceImage.objects.create(evidence=bio_evidence, image=image)
 
+        for upload in image_uploads:
+            image = BioEvidenceImage(evidence=bio_evidence)
+            consume_upload(upload, image.image)
+            image.save()
+
         return bio_evidence
 
 class VehicleEvidenceSerializer(BaseEvidenceSerializer):
     class Meta:
         model = VehicleEvidence
-        fields = "__all__"
+        exclude = ['plate_number_normalized', 'serial_number_normalized']
         read_only_fields = ['recorder']
     
     def validate(self, data):
@@ -90,10 +226,89 @@ class VehicleEvidenceSerializer(BaseEvidenceSerializer):
     
 
 
+class VehicleLookupQuerySerializer(serializers.Serializer):
+    plate = serializers.CharField(required=False, help_text="License plate, in any spacing or digit style.")
+    serial = serializers.CharField(required=False, help_text="Serial number (VIN).")
+    match = serializers.ChoiceField(
+        choices=["exact", "prefix"],
+        default="exact",
+        help_text="`prefix` also returns vehicles whose number starts with the given part, e.g. from a witness description.",
+    )
+
+    def validate(self, data):
+        data["plate"] = normalize_vehicle_number(data.get("plate"))
+        data["serial"] = normalize_vehicle_number(data.get("serial"))
+        if not data["plate"] and not data["serial"]:
+            raise serializers.ValidationError("Provide a plate or a serial number.")
+        return data
+
+
+class EvidenceCaseBriefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Case
+        fields = ["id", "title", "status", "crime_level", "crime_datetime"]
+        read_only_fields = fields
+
+
+class VehicleLookupSerializer(serializers.ModelSerializer):
+    case = EvidenceCaseBriefSerializer(read_only=True)
+
+    class Meta:
+        model = VehicleEvidence
+        fields = ["id", "title", "plate_number", "serial_number", "model_name", "color", "created_at", "case"]
+        read_only_fields = fields
+
+
+class IdentityLookupListSerializer(serializers.ListSerializer):
+    """
+    Loads the users whose national ID appears in `details.national_id` of the listed identities
+    with one query and shares them through `context["users_by_national_id"]`. Detail values are
+    free text, so they are normalized like stored national IDs first.
+    """
+    def to_representation(self, data):
+        identities = list(data.all() if isinstance(data, Manager) else data)
+
+        national_ids = {
+            normalize_national_id(identity.details["national_id"])
+            for identity in identities
+            if isinstance(identity.details, dict) and identity.details.get("national_id")
+        }
+        users_by_national_id = {}
+        for user in User.objects.filter(national_id__in=national_ids).order_by("id"):
+            users_by_national_id.setdefault(user.national_id, []).append(user)
+        self.context["users_by_national_id"] = users_by_national_id
+
+        return super().to_representation(identities)
+
+
+class IdentityLookupSerializer(serializers.ModelSerializer):
+    case = EvidenceCaseBriefSerializer(read_only=True)
+    linked_users = serializers.SerializerMethodField(
+        help_text="Users whose national ID is `details.national_id`.",
+    )
+
+    class Meta:
+        model = IdentityEvidence
+        fields = ["id", "title", "full_name", "details", "created_at", "case", "linked_users"]
+        read_only_fields = fields
+        list_serializer_class = IdentityLookupListSerializer
+
+    @extend_schema_field(UserBriefInfoSerializer(many=True))
+    def get_linked_users(self, obj):
+        national_id = obj.details.get("national_id") if isinstance(obj.details, dict) else None
+        national_id = normalize_national_id(national_id)
+        if not national_id:
+            return []
+        users = self.context.get("users_by_national_id", {}).get(national_id)
+        if users is None:
+            users = User.objects.filter(national_id=national_id).order_by("id")
+        return UserBriefInfoSerializer(users, many=True).data
+
+
 class IdentityEvidenceSerializer(BaseEvidenceSerializer):
     class Meta:
         model = IdentityEvidence
-        fields = "__all__"
+        exclude = ['details_national_id', 'details_father_name']
         read_only_fields = ['recorder']
 
 class OtherEvidenceSerializer(BaseEvidenceSerializer):
@@ -103,36 +318,55 @@ class OtherEvidenceSerializer(BaseEvidenceSerializer):
         read_only_fields = ['recorder']
 
 
+EVIDENCE_TYPE_SERIALIZERS = {
+    Evidence.EvidenceType.WITNESS: WitnessEvidenceSerializer,
+    Evidence.EvidenceType.BIO: BioEvidenceSerializer,
+    Evidence.EvidenceType.VEHICLE: VehicleEvidenceSerializer,
+    Evidence.EvidenceType.IDENTITY: IdentityEvidenceSerializer,
+    Evidence.EvidenceType.OTHER: OtherEvidenceSerializer,
+}
+
+
+class EvidenceListSerializer(serializers.ListSerializer):
+    """
+    Loads the subtype rows of all the evidences with one query per evidence type
+    and shares them with the child serializer through `context["evidence_subtypes"]`.
+    """
+    def to_representation(self, data):
+        evidences = list(data.all() if isinstance(data, Manager) else data)
+
+        ids_by_type: dict[str, set[int]] = {}
+        for evidence in evidences:
+            if evidence.evidence_type is not None:
+                ids_by_type.setdefault(evidence.evidence_type, set()).add(evidence.pk)
+
+        self.context["evidence_subtypes"] = {
+            evidence_type: EVIDENCE_TYPE_SERIALIZERS[evidence_type].get_subtype_queryset().in_bulk(ids)
+            for evidence_type, ids in ids_by_type.items()
+        }
+
+        return super().to_representation(evidences)
+
+
 class EvidencePolymorphicSerializer(serializers.Serializer):
     resource_type = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = EvidenceListSerializer
+
     def get_resource_type(self, obj) -> str:
         return obj.__class__.__name__
 
     def to_representation(self, instance):
-        if hasattr(instance, 'witnessevidence'):
-            data = WitnessEvidenceSerializer(instance.witnessevidence, context=self.context).data
-            data['resource_type'] = 'WitnessEvidence'
-            return data
-            
-        elif hasattr(instance, 'bioevidence'):
-            data = BioEvidenceSerializer(instance.bioevidence, context=self.context).data
-            data['resource_type'] = 'BioEvidence'
-            return data
-            
-        elif hasattr(instance, 'vehicleevidence'):
-            data = VehicleEvidenceSerializer(instance.vehicleevidence, context=self.context).data
-            data['resource_type'] = 'VehicleEvidence'
-            return data
-            
-        elif hasattr(instance, 'identityevidence'):
-            data = IdentityEvidenceSerializer(instance.identityevidence, context=self.context).data
-            data['resource_type'] = 'IdentityEvidence'
-            return data
-
-        elif hasattr(instance, 'otherevidence'):
-            data = OtherEvidenceSerializer(instance.otherevidence, context=self.context).data
-            data['resource_type'] = 'OtherEvidence'
-            return data
-
-        return super().to_representation(instance)
+        preloaded = self.context.get("evidence_subtypes", {}).get(instance.evidence_type)
+        if preloaded is not None:
+            subtype = preloaded.get(instance.pk)
+        else:
+            subtype = instance.get_subtype()
+
+        if subtype is None:
+            return super().to_representation(instance)
+
+        data = EVIDENCE_TYPE_SERIALIZERS[instance.evidence_type](subtype, context=self.context).data
+        data['resource_type'] = subtype.__class__.__name__
+        return data
@@ -0,0 +1,415 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.signing import Signer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from PIL import Image, ImageOps
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from accounts.validators import normalize_national_id
+
+from .models import EvidenceUpload, BioEvidenceImage, IdentityEvidence, identity_detail
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request / temporary file at a time
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class UploadOffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Upload-Offset does not match the number of bytes received so far."
+    default_code = "upload_offset_conflict"
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload chunk is too large."
+    default_code = "upload_too_large"
+
+
+class CompletedUploadFile(File):
+    """
+    File backed by the temporary file of a finished upload. `ContentAddressedStorage` hard links
+    files that expose `temporary_file_path` instead of copying them.
+    """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_upload_path(upload: EvidenceUpload) -> str:
+    return os.path.join(settings.EVIDENCE_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def append_upload_chunk(upload: EvidenceUpload, stream, offset: int, length: int) -> EvidenceUpload:
+    """
+    Stream `length` bytes of `stream` into the upload's temporary file at `offset`, without
+    buffering the chunk in memory. The checksum is verified once the last byte arrived; on a
+    mismatch the upload is reset so the client can send the file again.
+    """
+    if length > settings.EVIDENCE_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadTooLarge(f"Chunks can be at most {settings.EVIDENCE_UPLOAD_MAX_CHUNK_SIZE} bytes.")
+
+    with transaction.atomic():
+        upload = EvidenceUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.is_complete:
+            raise ValidationError({"detail": "This upload is already complete."})
+        if offset != upload.received_bytes:
+            raise UploadOffsetConflict(
+                f"Expected Upload-Offset {upload.received_bytes}, got {offset}."
+            )
+        if offset + length > upload.size:
+            raise ValidationError({"detail": f"Chunk ends past the declared file size ({upload.size} bytes)."})
+
+        path = get_upload_path(upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            # Drop the bytes of a chunk that was interrupted before being acknowledged
+            f.seek(offset)
+            f.truncate()
+            while written < length:
+                block = stream.read(min(STREAM_BLOCK_SIZE, length - written)) if stream else b""
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+            if written != length:
+                f.truncate(offset)
+                raise ValidationError({"detail": f"Expected {length} bytes in the chunk, received {written}."})
+
+        upload.received_bytes = offset + length
+        checksum_matched = None
+        if upload.received_bytes == upload.size:
+            checksum_matched = _file_sha256(path) == upload.checksum
+            if checksum_matched:
+                upload.is_complete = True
+            else:
+                upload.received_bytes = 0
+                os.remove(path)
+        upload.save(update_fields=["received_bytes", "is_complete", "updated_at"])
+
+    if checksum_matched is False:
+        raise ValidationError({"checksum": "The uploaded file does not match the checksum. Upload it again from offset 0."})
+    return upload
+
+
+def discard_upload(upload: EvidenceUpload) -> None:
+    path = get_upload_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def consume_upload(upload: EvidenceUpload, field_file) -> None:
+    """
+    Store a completed upload in `field_file` (e.g. `evidence.media_file`) and discard the upload
+    once the transaction commits, so it is left intact (and can be attached again) if the
+    transaction rolls back. The model instance of `field_file` still has to be saved by the
+    caller.
+    """
+    with open(get_upload_path(upload), "rb") as f:
+        field_file.save(upload.filename, CompletedUploadFile(f, name=upload.filename), save=False)
+    transaction.on_commit(partial(discard_upload, upload))
+
+
+# Longest side in pixels of each generated variant of a bio evidence image
+IMAGE_VARIANT_SIZES = {
+    "thumbnail": 256,
+    "medium": 1024,
+}
+
+_variant_executor = None
+
+
+def _get_variant_executor() -> ThreadPoolExecutor:
+    global _variant_executor
+    if _variant_executor is None:
+        _variant_executor = ThreadPoolExecutor(
+            max_workers=settings.EVIDENCE_IMAGE_VARIANT_WORKERS,
+            thread_name_prefix="evidence-image-variants",
+        )
+    return _variant_executor
+
+
+def generate_image_variants(image_id: int) -> None:
+    """
+    Render the downscaled variants (`IMAGE_VARIANT_SIZES`) of a `BioEvidenceImage` as JPEGs
+    and store them on the image.
+    """
+    image = BioEvidenceImage.objects.filter(pk=image_id).first()
+    if image is None:
+        return
+
+    with image.image.open("rb") as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode != "RGB":
+        original = original.convert("RGB")
+
+    stem = os.path.splitext(os.path.basename(image.image.name))[0]
+    for field_name, max_side in IMAGE_VARIANT_SIZES.items():
+        variant = original.copy()
+        variant.thumbnail((max_side, max_side))
+        buffer = BytesIO()
+        variant.save(buffer, format="JPEG", quality=85, optimize=True)
+        getattr(image, field_name).save(f"{stem}_{field_name}.jpg", ContentFile(buffer.getvalue()), save=False)
+    saved = {field_name: getattr(image, field_name).name for field_name in IMAGE_VARIANT_SIZES}
+
+    # Only the variant columns are written, the image row may have changed meanwhile. The row is
+    # locked so overlapping runs release each replaced variant once. `update()` skips the signals
+    # that release replaced media, so they are released here.
+    with transaction.atomic():
+        previous = (
+            BioEvidenceImage.objects.select_for_update()
+            .filter(pk=image_id)
+            .values(*IMAGE_VARIANT_SIZES)
+            .first()
+        )
+        if previous is None:
+            # Deleted while rendering: nothing references the variants just stored
+            released = saved
+        else:
+            BioEvidenceImage.objects.filter(pk=image_id).update(**saved)
+            released = previous
+        for field_name, name in released.items():
+            if name:
+                transaction.on_commit(partial(getattr(image, field_name).storage.delete, name))
+
+
+def _generate_image_variants_logged(image_id: int) -> None:
+    try:
+        generate_image_variants(image_id)
+    except Exception:
+        logger.exception("Generating the variants of bio evidence image %s failed", image_id)
+
+
+def _generate_image_variants_in_worker(image_id: int) -> None:
+    try:
+        _generate_image_variants_logged(image_id)
+    finally:
+        # Worker threads open their own database connections
+        connections.close_all()
+
+
+def schedule_image_variants(image_id: int) -> None:
+    """
+    Generate the variants of a `BioEvidenceImage` once the current transaction commits,
+    in the background worker pool unless `EVIDENCE_IMAGE_VARIANT_WORKERS` is 0.
+    """
+    if settings.EVIDENCE_IMAGE_VARIANT_WORKERS > 0:
+        transaction.on_commit(lambda: _get_variant_executor().submit(_generate_image_variants_in_worker, image_id))
+    else:
+        transaction.on_commit(lambda: _generate_image_variants_logged(image_id))
+
+
+# ---------------------------------------------------------------------
+# Serving evidence media
+# ---------------------------------------------------------------------
+
+_BYTE_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+MEDIA_SIGNATURE_SALT = "evidence.media"
+
+
+def _media_signature(name: str, user_id: int, expires: int) -> str:
+    return Signer(salt=MEDIA_SIGNATURE_SALT).signature(f"{user_id}:{expires}:{name}")
+
+
+def sign_media_name(name: str, user_id: int) -> dict[str, str]:
+    """
+    Query parameters letting `user_id` download `name` without an Authorization header (e.g. from
+    `<img src>`). Expiry is rounded up to whole `EVIDENCE_MEDIA_URL_MAX_AGE` periods so URLs stay
+    the same, and cacheable by browsers, within a period.
+    """
+    max_age = settings.EVIDENCE_MEDIA_URL_MAX_AGE
+    expires = (int(time.time()) // max_age + 2) * max_age
+    return {"user": str(user_id), "expires": str(expires), "signature": _media_signature(name, user_id, expires)}
+
+
+def check_media_signature(name: str, params) -> int | None:
+    """The id of the user a signed media URL was issued to, None if unsigned, forged or expired."""
+    try:
+        user_id = int(params["user"])
+        expires = int(params["expires"])
+        signature = params["signature"]
+    except (KeyError, ValueError):
+        return None
+    if expires < time.time() or not constant_time_compare(signature, _media_signature(name, user_id, expires)):
+        return None
+    return user_id
+
+
+def media_etag(storage, name: str) -> str:
+    """
+    Content addressed files are tagged with their digest; older files with their size and
+    modification time.
+    """
+    digest = getattr(storage, "blob_digest", lambda _: None)(name)
+    if digest is None:
+        digest = f"{storage.size(name):x}-{int(storage.get_modified_time(name).timestamp()):x}"
+    return quote_etag(digest)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    The inclusive `(start, end)` of a single `Range: bytes=...` header, or None when it is
+    missing or not a single byte range (the whole file is sent then). Raises ValueError when the
+    range is unsatisfiable.
+    """
+    match = _BYTE_RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last `end` bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _read_range(f, start: int, end: int):
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def build_media_response(request, storage, name: str) -> HttpResponse:
+    """
+    Respond with the file `name` of `storage`, honouring If-None-Match and single byte Range
+    requests. Depending on `EVIDENCE_MEDIA_SERVE_MODE` the bytes are streamed by Django or
+    the transfer is delegated to the web server with X-Accel-Redirect / X-Sendfile, which then
+    handles Range itself. Access has to be checked by the caller.
+    """
+    etag = media_etag(storage, name)
+    if _etag_matches(request.headers.get("If-None-Match", ""), etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    mode = settings.EVIDENCE_MEDIA_SERVE_MODE
+
+    if mode == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.EVIDENCE_MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + name
+    elif mode == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = storage.path(name)
+    else:
+        size = storage.size(name)
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range == etag:
+            try:
+                byte_range = parse_byte_range(request.headers.get("Range", ""), size)
+            except ValueError:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        if byte_range is None:
+            response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(storage.open(name, "rb"), start, end),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type,
+            )
+            response["Content-Length"] = str(end - start + 1)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# ---------------------------------------------------------------------
+# Identity details lookups
+# ---------------------------------------------------------------------
+
+IDENTITY_DETAILS_GIN_INDEX = "identity_details_keys_gin"
+# Replaced by IDENTITY_DETAILS_GIN_INDEX: jsonb_path_ops only serves containment, which compares
+# values with their JSON type
+OLD_IDENTITY_DETAILS_GIN_INDEX = "identity_details_gin"
+
+
+def create_identity_details_index(using=None) -> None:
+    """
+    GIN index serving key existence (`?`) lookups on any key of `IdentityEvidence.details`.
+    PostgreSQL only, created after every migrate since the other backends have no GIN.
+    """
+    db = connections[using or DEFAULT_DB_ALIAS]
+    if db.vendor != "postgresql":
+        return
+    with db.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {OLD_IDENTITY_DETAILS_GIN_INDEX}")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {IDENTITY_DETAILS_GIN_INDEX} "
+            f"ON {IdentityEvidence._meta.db_table} USING gin (details)"
+        )
+
+
+def filter_identity_details(queryset, details: dict[str, str]):
+    """
+    Narrow an `IdentityEvidence` queryset to rows whose `details` have every given key/value
+    pair, comparing values as text (a stored `12345` matches `"12345"`). `INDEXED_DETAIL_KEYS`
+    are compared on their generated column; other keys on `details ->> key`, after a key
+    existence lookup the GIN index serves on PostgreSQL. National IDs are normalized like the
+    stored ones (see `IdentityEvidence.save`).
+    """
+    for i, (key, value) in enumerate(details.items()):
+        if key == "national_id":
+            value = normalize_national_id(value)
+        if key in IdentityEvidence.INDEXED_DETAIL_KEYS:
+            queryset = queryset.filter(**{f"details_{key}": value})
+        else:
+            alias = f"detail_{i}"
+            queryset = queryset.filter(details__has_key=key)
+            queryset = queryset.alias(**{alias: identity_detail(key)}).filter(**{alias: value})
+    return queryset
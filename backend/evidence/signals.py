@@ -0,0 +1,82 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.dispatch import receiver
+
+from .models import BioEvidenceImage, WitnessEvidence
+from .services import schedule_image_variants, create_identity_details_index
+from .storage import ContentAddressedStorage
+
+
+def evidence_app_migrated(sender, using=None, **kwargs):
+    create_identity_details_index(using)
+
+
+@receiver(post_save, sender=BioEvidenceImage)
+def bio_evidence_image_saved(sender, instance, created, update_fields=None, **kwargs):
+    image_changed = created or update_fields is None or "image" in update_fields
+    if image_changed and instance.image:
+        schedule_image_variants(instance.pk)
+
+
+# ---------------------------------------------------------------------
+# Reference counting of content addressed media
+# ---------------------------------------------------------------------
+
+def _content_addressed_fields(model) -> list[FileField]:
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def _release_after_commit(field: FileField, name: str) -> None:
+    if name:
+        transaction.on_commit(partial(field.storage.delete, name))
+
+
+@receiver(pre_save, sender=WitnessEvidence)
+@receiver(pre_save, sender=BioEvidenceImage)
+def remember_replaced_media(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = [
+        field for field in _content_addressed_fields(sender)
+        if update_fields is None or field.name in update_fields
+    ]
+    if not fields:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*[field.attname for field in fields]).first() or {}
+    instance._replaced_media = [
+        (field, previous.get(field.attname))
+        for field in fields
+        if _replaces_reference(instance, field, previous.get(field.attname))
+    ]
+
+
+def _replaces_reference(instance, field: FileField, previous_name) -> bool:
+    file = getattr(instance, field.attname)
+    # Content saved again under the same blob name still added a reference
+    return (
+        previous_name != file.name
+        or not file._committed
+        or field.attname in getattr(instance, "_added_media_references", ())
+    )
+
+
+@receiver(post_save, sender=WitnessEvidence)
+@receiver(post_save, sender=BioEvidenceImage)
+def release_replaced_media(sender, instance, **kwargs):
+    for field, name in getattr(instance, "_replaced_media", []):
+        _release_after_commit(field, name)
+    instance._replaced_media = []
+    instance._added_media_references = set()
+
+
+@receiver(post_delete, sender=WitnessEvidence)
+@receiver(post_delete, sender=BioEvidenceImage)
+def release_deleted_media(sender, instance, **kwargs):
+    for field in _content_addressed_fields(sender):
+        _release_after_commit(field, getattr(instance, field.attname).name)
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import shutil
+import uuid
+import weakref
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile, ImageFieldFile
+from django.utils.deconstruct import deconstructible
+
+# Bytes hashed at a time
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StagedBlob:
+    """
+    Content written to the staging directory of a `ContentAddressedStorage`, published under
+    its blob name once the transaction that references it commits. Its file is removed as soon
+    as the object is dropped, e.g. along with the on-commit callbacks of a rolled back
+    transaction.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._remove = weakref.finalize(self, _remove_file, path)
+
+    def publish(self, blob_path: str) -> None:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(self.path, blob_path)
+        except FileExistsError:
+            # Published by another transaction that stored the same content
+            pass
+        except OSError:
+            # No hard links on this file system
+            tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(self.path, tmp_path)
+            os.replace(tmp_path, blob_path)
+        self._remove()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keeps every distinct content once, named after its SHA-256 digest
+    (`evidence/blobs/ab/cd/abcd....ext`). Saving content that is already stored only hashes it
+    and bumps the blob's reference count in `StoredBlob`; `delete` removes the file once no
+    reference is left.
+
+    Content is hashed while it is written to a staging file (or hard linked there when it is
+    already a temporary file), which is moved into place once the transaction commits. A rolled
+    back transaction therefore leaves no blob file behind.
+
+    Files saved before this storage was used have no `StoredBlob` row and are deleted directly.
+    URLs point to the access checked media endpoint (`EVIDENCE_MEDIA_URL`) instead of MEDIA_URL.
+    """
+    prefix = "evidence/blobs"
+    staging_prefix = "evidence/staging"
+
+    def blob_digest(self, name: str) -> str | None:
+        """The SHA-256 of the content stored under `name`, None for files saved before this storage."""
+        if not name.startswith(f"{self.prefix}/"):
+            return None
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in `_save`
+        return name
+
+    def _stage(self, content) -> tuple[StagedBlob, str, int]:
+        """Copy `content` to a new staging file, hashing it on the way."""
+        staged = StagedBlob(self.path(f"{self.staging_prefix}/{uuid.uuid4().hex}"))
+        os.makedirs(os.path.dirname(staged.path), exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        if hasattr(content, "temporary_file_path"):
+            try:
+                os.link(content.temporary_file_path(), staged.path)
+            except OSError:
+                pass
+            else:
+                with open(staged.path, "rb") as f:
+                    while block := f.read(HASH_BLOCK_SIZE):
+                        digest.update(block)
+                        size += len(block)
+                return staged, digest.hexdigest(), size
+
+        if hasattr(content, "seek"):
+            content.seek(0)
+        with open(staged.path, "wb") as f:
+            for chunk in content.chunks(HASH_BLOCK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        return staged, digest.hexdigest(), size
+
+    def _blob_name(self, digest: str, name: str) -> str:
+        ext = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        staged, digest, size = self._stage(content)
+        blob_name = self._blob_name(digest, name)
+        with transaction.atomic():
+            blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                name=blob_name,
+                defaults={"size": size, "ref_count": 0},
+            )
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+        if not self.exists(blob_name):
+            transaction.on_commit(partial(staged.publish, self.path(blob_name)))
+        return blob_name
+
+    def delete(self, name):
+        from .models import StoredBlob
+
+        if not name:
+            return
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                super().delete(name)
+                return
+            if blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+
+evidence_media_storage = ContentAddressedStorage(base_url=settings.EVIDENCE_MEDIA_URL)
+
+
+def get_evidence_media_storage():
+    return evidence_media_storage
+
+
+class ContentAddressedFieldFileMixin:
+    """
+    Records on the model instance that `save` added a reference to the stored blob, so that
+    saving the instance releases the reference of the file it held before, even when the
+    content (and so the name) is the same. See `evidence.signals`.
+    """
+    def save(self, name, content, save=True):
+        super().save(name, content, save=False)
+        if not hasattr(self.instance, "_added_media_references"):
+            self.instance._added_media_references = set()
+        self.instance._added_media_references.add(self.field.attname)
+        if save:
+            self.instance.save()
+
+
+class ContentAddressedFieldFile(ContentAddressedFieldFileMixin, FieldFile):
+    pass
+
+
+class ContentAddressedImageFieldFile(ContentAddressedFieldFileMixin, ImageFieldFile):
+    pass
+
+
+class ContentAddressedFileField(models.FileField):
+    """`FileField` for a `ContentAddressedStorage`, whose references are counted by `evidence.signals`."""
+    attr_class = ContentAddressedFieldFile
+
+
+class ContentAddressedImageField(models.ImageField):
+    """`ImageField` for a `ContentAddressedStorage`, whose references are counted by `evidence.signals`."""
+    attr_class = ContentAddressedImageFieldFile
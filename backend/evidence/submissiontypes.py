@@ -20,6 +20,10 @@ class BioEvidenceSubmissionType(BaseSubmissionType["BioEvidence"]):
         "TODO":""
     }
 
+    @classmethod
+    def get_target_queryset(cls):
+        return super().get_target_queryset().prefetch_related("images")
+
 
     @classmethod
     def on_submit(cls, submission: Submission) -> None:
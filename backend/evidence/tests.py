@@ -1,7 +1,25 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from PIL import Image, ImageOps
+
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Evidence
+from .models import Evidence, BioEvidence, BioEvidenceImage, WitnessEvidence, VehicleEvidence, IdentityEvidence, OtherEvidence, EvidenceUpload, StoredBlob
 from cases.models import Case
+from .services import consume_upload, generate_image_variants
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -27,4 +45,612 @@ class EvidenceTests(APITestCase):
     def test_evidence_list(self):
         self.client.force_authenticate(user=self.recorder1)
         response = self.client.get(self.list_url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK) 
+
+class EvidenceTypeListTests(APITestCase):
+    def setUp(self) -> None:
+        self.case = Case.objects.create(
+            title="Evidence list case",
+            description="description",
+            crime_datetime=timezone.now()
+        )
+        self.recorder = User.objects.create_user(username="recorder", password="password123")
+        self.list_url = reverse('evidence-list')
+
+    def create_evidences(self, count):
+        common = {"case": self.case, "recorder": self.recorder, "description": "description"}
+        for i in range(count):
+            WitnessEvidence.objects.create(title=f"Witness {i}", transcript="transcript", **common)
+            VehicleEvidence.objects.create(title=f"Vehicle {i}", model_name="Pride", color="white", plate_number="12A345", **common)
+            IdentityEvidence.objects.create(title=f"Identity {i}", full_name="John Doe", **common)
+            OtherEvidence.objects.create(title=f"Other {i}", **common)
+            bio = BioEvidence.objects.create(title=f"Bio {i}", **common)
+            for j in range(2):
+                BioEvidenceImage.objects.create(evidence=bio, image=f"evidence/bio/sample_{i}_{j}.jpg")
+
+    def count_list_queries(self):
+        # Fresh user object and no cached permission snapshot, so every request loads permissions
+        cache.clear()
+        self.client.force_authenticate(user=User.objects.get(pk=self.recorder.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_evidence_type_is_set_on_create(self):
+        self.create_evidences(1)
+        self.assertSetEqual(
+            set(Evidence.objects.values_list("evidence_type", flat=True)),
+            {"witness", "vehicle", "identity", "other", "bio"},
+        )
+
+    def test_list_query_count_is_constant(self):
+        self.create_evidences(1)
+        _, queries_small = self.count_list_queries()
+
+        self.create_evidences(4)
+        data, queries_large = self.count_list_queries()
+
+        self.assertEqual(queries_small, queries_large)
+        self.assertEqual(len(data), 25)
+        vehicle = next(item for item in data if item["resource_type"] == "VehicleEvidence")
+        self.assertEqual(vehicle["plate_number"], "12A345")
+        identity = next(item for item in data if item["resource_type"] == "IdentityEvidence")
+        self.assertEqual(identity["full_name"], "John Doe")
+        bio = next(item for item in data if item["resource_type"] == "BioEvidence")
+        self.assertEqual(len(bio["images"]), 2)
+
+    def test_retrieve_and_update_use_subtype(self):
+        self.create_evidences(1)
+        vehicle = VehicleEvidence.objects.get()
+        self.client.force_authenticate(user=self.recorder)
+        url = reverse('evidence-detail', kwargs={"pk": vehicle.pk})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["resource_type"], "VehicleEvidence")
+
+        response = self.client.patch(url, data={"color": "black"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        vehicle.refresh_from_db()
+        self.assertEqual(vehicle.color, "black")
+
+
+class EvidenceUploadTests(APITestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        settings_override = self.settings(
+            EVIDENCE_UPLOAD_DIR=os.path.join(self.tmp_dir, "uploads"),
+            MEDIA_ROOT=os.path.join(self.tmp_dir, "media"),
+            EVIDENCE_UPLOAD_MAX_CHUNK_SIZE=8,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recorder = User.objects.create_user(username="recorder", password="password123")
+        self.case = Case.objects.create(
+            title="Upload case",
+            description="description",
+            crime_datetime=timezone.now(),
+            lead_detective=self.recorder,
+        )
+        self.content = b"body-cam video bytes"
+        self.client.force_authenticate(user=self.recorder)
+
+    def start_upload(self, checksum=None):
+        response = self.client.post(reverse("evidence-upload-create"), data={
+            "filename": "video.mp4",
+            "size": len(self.content),
+            "checksum": checksum or hashlib.sha256(self.content).hexdigest(),
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()["id"]
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            reverse("evidence-upload-detail", kwargs={"pk": upload_id}),
+            data=chunk,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def send_all(self, upload_id):
+        response = None
+        for offset in range(0, len(self.content), 8):
+            response = self.send_chunk(upload_id, offset, self.content[offset:offset + 8])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_chunked_upload_is_attached_to_witness_evidence(self):
+        upload_id = self.start_upload()
+
+        response = self.send_chunk(upload_id, 0, self.content[:8])
+        self.assertEqual(response.json()["offset"], 8)
+        # Resending from a stale offset is rejected with the current state left untouched
+        response = self.send_chunk(upload_id, 0, self.content[:8])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.send_chunk(upload_id, 8, self.content[8:16])
+        response = self.send_chunk(upload_id, 16, self.content[16:])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()["is_complete"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("evidence-list"), data={
+                "type": "witness",
+                "title": "Body cam",
+                "description": "description",
+                "case": self.case.pk,
+                "media_upload": upload_id,
+            }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        evidence = WitnessEvidence.objects.get()
+        with evidence.media_file.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(EvidenceUpload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir, "uploads")), [])
+
+    def test_upload_survives_a_rolled_back_attach(self):
+        upload_id = self.start_upload()
+        self.send_all(upload_id)
+        upload = EvidenceUpload.objects.get(pk=upload_id)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                evidence = WitnessEvidence(case=self.case, recorder=self.recorder, title="Body cam", description="description")
+                consume_upload(upload, evidence.media_file)
+                evidence.save()
+                raise RuntimeError("rollback")
+        self.assertEqual(callbacks, [])
+        self.assertTrue(EvidenceUpload.objects.filter(pk=upload_id).exists())
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir, "uploads")), [f"{upload_id}.part"])
+
+        # The upload can still be attached
+        with self.captureOnCommitCallbacks(execute=True):
+            evidence = WitnessEvidence(case=self.case, recorder=self.recorder, title="Body cam", description="description")
+            consume_upload(upload, evidence.media_file)
+            evidence.save()
+        with evidence.media_file.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(EvidenceUpload.objects.exists())
+
+    def test_checksum_mismatch_resets_upload(self):
+        upload_id = self.start_upload(checksum="0" * 64)
+        for offset in range(0, 16, 8):
+            self.send_chunk(upload_id, offset, self.content[offset:offset + 8])
+        response = self.send_chunk(upload_id, 16, self.content[16:])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("checksum", response.json())
+
+        upload = EvidenceUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.received_bytes, 0)
+        self.assertFalse(upload.is_complete)
+
+    def test_size_limits_are_enforced(self):
+        upload_id = self.start_upload()
+        response = self.send_chunk(upload_id, 0, self.content[:9])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        with self.settings(EVIDENCE_UPLOAD_MAX_SIZE=4):
+            response = self.client.post(reverse("evidence-upload-create"), data={
+                "filename": "video.mp4",
+                "size": len(self.content),
+                "checksum": hashlib.sha256(self.content).hexdigest(),
+            }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("size", response.json())
+
+    def test_incomplete_upload_cannot_be_attached(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, self.content[:8])
+        response = self.client.post(reverse("evidence-list"), data={
+            "type": "witness",
+            "title": "Body cam",
+            "description": "description",
+            "case": self.case.pk,
+            "media_upload": upload_id,
+        }, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("media_upload", response.json())
+
+
+class BioEvidenceImageVariantTests(APITestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        settings_override = self.settings(MEDIA_ROOT=self.tmp_dir, EVIDENCE_IMAGE_VARIANT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recorder = User.objects.create_user(username="recorder", password="password123")
+        self.case = Case.objects.create(
+            title="Autopsy case",
+            description="description",
+            crime_datetime=timezone.now(),
+        )
+        self.bio = BioEvidence.objects.create(
+            case=self.case, recorder=self.recorder, title="Sample", description="description"
+        )
+
+    def make_image_file(self, size):
+        buffer = BytesIO()
+        Image.new("RGB", size, color="red").save(buffer, format="PNG")
+        return SimpleUploadedFile("sample.png", buffer.getvalue(), content_type="image/png")
+
+    def test_variants_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = BioEvidenceImage.objects.create(evidence=self.bio, image=self.make_image_file((2000, 1000)))
+
+        image.refresh_from_db()
+        with image.thumbnail.open("rb") as f:
+            self.assertEqual(Image.open(f).size, (256, 128))
+        with image.medium.open("rb") as f:
+            self.assertEqual(Image.open(f).size, (1024, 512))
+
+        self.client.force_authenticate(user=self.recorder)
+        response = self.client.get(reverse("evidence-list"))
+        item = response.json()[0]["images"][0]
+        self.assertIn(image.thumbnail.name + "?", item["thumbnail"])
+        self.assertIn(image.medium.name + "?", item["medium"])
+
+
+    def create_image_without_variants(self):
+        with mock.patch("evidence.signals.schedule_image_variants"), self.captureOnCommitCallbacks(execute=True):
+            return BioEvidenceImage.objects.create(evidence=self.bio, image=self.make_image_file((600, 300)))
+
+    def assert_references_match_fields(self):
+        references = {}
+        for image in BioEvidenceImage.objects.all():
+            for name in (image.image.name, image.thumbnail.name, image.medium.name):
+                if name:
+                    references[name] = references.get(name, 0) + 1
+        self.assertEqual(dict(StoredBlob.objects.values_list("name", "ref_count")), references)
+
+    def test_variants_of_an_image_deleted_while_rendering_are_released(self):
+        image = self.create_image_without_variants()
+        exif_transpose = ImageOps.exif_transpose
+
+        def delete_then_transpose(original):
+            BioEvidenceImage.objects.filter(pk=image.pk).delete()
+            return exif_transpose(original)
+
+        with mock.patch("evidence.services.ImageOps.exif_transpose", delete_then_transpose), \
+                self.captureOnCommitCallbacks(execute=True):
+            generate_image_variants(image.pk)
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_overlapping_runs_release_replaced_variants_once(self):
+        image = self.create_image_without_variants()
+        exif_transpose = ImageOps.exif_transpose
+        calls = []
+
+        def transpose_with_overlapping_run(original):
+            calls.append(original)
+            if len(calls) == 1:
+                generate_image_variants(image.pk)
+            return exif_transpose(original)
+
+        with mock.patch("evidence.services.ImageOps.exif_transpose", transpose_with_overlapping_run), \
+                self.captureOnCommitCallbacks(execute=True):
+            generate_image_variants(image.pk)
+        self.assert_references_match_fields()
+
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        settings_override = self.settings(MEDIA_ROOT=self.tmp_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recorder = User.objects.create_user(username="recorder", password="password123")
+        self.case = Case.objects.create(
+            title="Shared footage case",
+            description="description",
+            crime_datetime=timezone.now(),
+        )
+
+    def create_witness(self, content):
+        evidence = WitnessEvidence(case=self.case, recorder=self.recorder, title="Footage", description="description")
+        # Blob files are moved into place once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            evidence.media_file.save("footage.mp4", ContentFile(content), save=False)
+            evidence.save()
+        return evidence
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.tmp_dir)
+            for root, _, names in os.walk(self.tmp_dir)
+            for name in names
+        )
+
+    def test_identical_media_is_stored_once(self):
+        first = self.create_witness(b"same footage")
+        second = self.create_witness(b"same footage")
+
+        self.assertEqual(first.media_file.name, second.media_file.name)
+        self.assertTrue(first.media_file.name.startswith("evidence/blobs/"))
+        self.assertEqual(StoredBlob.objects.get(name=first.media_file.name).ref_count, 2)
+
+        path = first.media_file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredBlob.objects.get(name=second.media_file.name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_replacing_media_releases_the_old_blob(self):
+        evidence = self.create_witness(b"first take")
+        old_path = evidence.media_file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            evidence.media_file.save("footage.mp4", ContentFile(b"second take"), save=False)
+            evidence.save()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(evidence.media_file.path))
+        self.assertEqual(list(StoredBlob.objects.values_list("name", flat=True)), [evidence.media_file.name])
+
+    def test_saving_the_same_content_again_keeps_one_reference(self):
+        evidence = self.create_witness(b"hello")
+        with self.captureOnCommitCallbacks(execute=True):
+            evidence.media_file.save("footage.mp4", ContentFile(b"hello"))
+        self.assertEqual(StoredBlob.objects.get(name=evidence.media_file.name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            evidence.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rolled_back_save_leaves_no_file(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            evidence = WitnessEvidence(case=self.case, recorder=self.recorder, title="Footage", description="description")
+            evidence.media_file.save("footage.mp4", ContentFile(b"never committed"))
+            raise RuntimeError("rollback")
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+
+class EvidenceMediaTests(APITestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        settings_override = self.settings(MEDIA_ROOT=self.tmp_dir, EVIDENCE_MEDIA_SERVE_MODE="django")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.detective = User.objects.create_user(username="detective", password="password123")
+        self.outsider = User.objects.create_user(username="outsider", password="password123")
+        self.case = Case.objects.create(
+            title="Footage case",
+            description="description",
+            crime_datetime=timezone.now(),
+            lead_detective=self.detective,
+        )
+        self.content = b"0123456789abcdef"
+        self.evidence = WitnessEvidence(case=self.case, recorder=self.detective, title="Footage", description="description")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.evidence.media_file.save("footage.mp4", ContentFile(self.content), save=False)
+            self.evidence.save()
+        self.url = reverse("evidence-media", args=[self.evidence.media_file.name])
+
+    def test_media_requires_case_access(self):
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.detective)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        listed = self.client.get(reverse("evidence-detail", args=[self.evidence.id])).json()
+        self.assertIn(self.url + "?", listed["media_file"])
+
+    def test_signed_url_from_response_works_without_authorization(self):
+        self.client.force_authenticate(user=self.detective)
+        media_url = self.client.get(reverse("evidence-detail", args=[self.evidence.id])).json()["media_file"]
+        self.client.force_authenticate(user=None)
+
+        parts = urlsplit(media_url)
+        response = self.client.get(f"{parts.path}?{parts.query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+        self.assertEqual(self.client.get(parts.path).status_code, status.HTTP_401_UNAUTHORIZED)
+        params = parse_qs(parts.query)
+        forged = f"{parts.path}?user={self.outsider.pk}&expires={params['expires'][0]}&signature={params['signature'][0]}"
+        self.assertEqual(self.client.get(forged).status_code, status.HTTP_401_UNAUTHORIZED)
+        with mock.patch("evidence.services.time.time", return_value=int(params["expires"][0]) + 1):
+            self.assertEqual(self.client.get(f"{parts.path}?{parts.query}").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_range_and_conditional_requests(self):
+        self.client.force_authenticate(user=self.detective)
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], f"bytes 2-5/{len(self.content)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"def")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(etag, f'"{hashlib.sha256(self.content).hexdigest()}"')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_transfer_is_delegated_to_the_web_server(self):
+        self.client.force_authenticate(user=self.detective)
+
+        with self.settings(EVIDENCE_MEDIA_SERVE_MODE="x-accel-redirect", EVIDENCE_MEDIA_ACCEL_PREFIX="/protected-media/"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.evidence.media_file.name}")
+        self.assertEqual(response.content, b"")
+
+        with self.settings(EVIDENCE_MEDIA_SERVE_MODE="x-sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], self.evidence.media_file.path)
+
+
+class VehicleLookupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.officer = User.objects.create_user(username="officer", password="password123")
+        cls.officer.user_permissions.add(Permission.objects.get(codename="view_evidence"))
+        cls.outsider = User.objects.create_user(username="outsider", password="password123")
+
+        cls.robbery = Case.objects.create(title="Robbery", description="description", crime_datetime=timezone.now())
+        cls.hit_and_run = Case.objects.create(title="Hit and run", description="description", crime_datetime=timezone.now())
+        common = {"recorder": cls.officer, "description": "description", "model_name": "Pride", "color": "white"}
+        cls.getaway = VehicleEvidence.objects.create(case=cls.robbery, title="Getaway car", plate_number="12 ب 345 - 67", **common)
+        cls.seen_again = VehicleEvidence.objects.create(case=cls.hit_and_run, title="Same car", plate_number="۱۲ب۳۴۵-۶۷", **common)
+        cls.other = VehicleEvidence.objects.create(case=cls.hit_and_run, title="Other car", plate_number="12ب99967", **common)
+        cls.truck = VehicleEvidence.objects.create(case=cls.robbery, title="Truck", serial_number="ir-1hgcm 8263", **common)
+
+    def lookup(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("evidence-vehicle-lookup"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+
+    def test_numbers_are_normalized(self):
+        self.assertEqual(self.getaway.plate_number_normalized, "12ب34567")
+        self.assertEqual(self.seen_again.plate_number_normalized, "12ب34567")
+        self.assertEqual(self.truck.serial_number_normalized, "IR1HGCM8263")
+
+    def test_plate_is_found_across_cases(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.lookup(User.objects.get(pk=self.officer.pk), plate="12-ب-345 67")
+        self.assertCountEqual([item["id"] for item in results], [self.getaway.id, self.seen_again.id])
+        self.assertCountEqual([item["case"]["id"] for item in results], [self.robbery.id, self.hit_and_run.id])
+        # Permission lookups aside, evidence and cases come from a single query
+        lookup_queries = [
+            q for q in queries.captured_queries
+            if ("evidence_vehicleevidence" in q["sql"] or "cases_case" in q["sql"])
+            and "auth_permission" not in q["sql"]
+        ]
+        self.assertEqual(len(lookup_queries), 1)
+
+        results = self.lookup(self.officer, serial="IR1HGCM8263")
+        self.assertEqual([item["id"] for item in results], [self.truck.id])
+
+    def test_prefix_lookup(self):
+        results = self.lookup(self.officer, plate="۱۲ب", match="prefix")
+        self.assertCountEqual([item["id"] for item in results], [self.getaway.id, self.seen_again.id, self.other.id])
+
+        self.assertEqual(self.lookup(self.officer, plate="12ب", match="exact"), [])
+
+    def test_lookup_respects_evidence_access(self):
+        self.assertEqual(self.lookup(self.outsider, plate="12ب34567"), [])
+
+        self.client.force_authenticate(user=self.officer)
+        response = self.client.get(reverse("evidence-vehicle-lookup"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdentityLookupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.officer = User.objects.create_user(username="officer", password="password123")
+        cls.officer.user_permissions.add(Permission.objects.get(codename="view_evidence"))
+        cls.outsider = User.objects.create_user(username="outsider", password="password123")
+        cls.owner = User.objects.create_user(username="owner", password="password123", national_id="0012345678")
+
+        cls.case = Case.objects.create(title="Robbery", description="description", crime_datetime=timezone.now())
+        common = {"case": cls.case, "recorder": cls.officer, "description": "description"}
+        cls.wallet = IdentityEvidence.objects.create(
+            title="Wallet", full_name="Reza Karimi",
+            details={"national_id": "0012345678", "father_name": "Hossein", "card_color": "green"}, **common,
+        )
+        cls.passport = IdentityEvidence.objects.create(
+            title="Passport", full_name="Reza Karimi",
+            details={"national_id": "0012345678", "passport_no": "K1234"}, **common,
+        )
+        cls.license = IdentityEvidence.objects.create(
+            title="License", full_name="Ali Ahmadi", details={"national_id": "0099999999"}, **common,
+        )
+
+    def lookup(self, user, **params):
+        self.client.force_authenticate(user=user)
+        return self.client.get(reverse("evidence-identity-lookup"), params)
+
+    def test_lookup_by_indexed_and_arbitrary_keys(self):
+        response = self.lookup(self.officer, **{"details.national_id": "0012345678"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountEqual([item["id"] for item in response.json()], [self.wallet.id, self.passport.id])
+
+        response = self.lookup(self.officer, **{"details.national_id": "0012345678", "details.card_color": "green"})
+        self.assertEqual([item["id"] for item in response.json()], [self.wallet.id])
+
+        response = self.lookup(self.officer, **{"details.passport_no": "K1234"})
+        self.assertEqual([item["id"] for item in response.json()], [self.passport.id])
+
+    def test_values_are_compared_as_text(self):
+        badge = IdentityEvidence.objects.create(
+            title="Badge", full_name="Reza Karimi", details={"badge_no": 12345, "national_id": 12345678},
+            case=self.case, recorder=self.officer, description="description",
+        )
+        response = self.lookup(self.officer, **{"details.badge_no": "12345"})
+        self.assertEqual([item["id"] for item in response.json()], [badge.id])
+        response = self.lookup(self.officer, **{"details.national_id": "12345678"})
+        self.assertEqual([item["id"] for item in response.json()], [badge.id])
+
+    def test_matches_are_linked_to_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.lookup(User.objects.get(pk=self.officer.pk), **{"details.father_name": "Hossein"})
+        [item] = response.json()
+        self.assertEqual([user["id"] for user in item["linked_users"]], [self.owner.id])
+        self.assertEqual(item["case"]["id"], self.case.id)
+
+        with CaptureQueriesContext(connection) as many_queries:
+            response = self.lookup(User.objects.get(pk=self.officer.pk), **{"details.national_id": "0012345678"})
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(len(many_queries), len(queries))
+
+        response = self.lookup(self.officer, **{"details.national_id": "0099999999"})
+        self.assertEqual(response.json()[0]["linked_users"], [])
+
+    def test_national_ids_are_normalized_before_linking(self):
+        card = IdentityEvidence.objects.create(
+            title="Card", full_name="Reza Karimi", details={"national_id": "۰۰۱-۲۳۴ ۵۶۷۸", "card_no": "C1"},
+            case=self.case, recorder=self.officer, description="description",
+        )
+        [item] = self.lookup(self.officer, **{"details.card_no": "C1"}).json()
+        self.assertEqual(item["id"], card.id)
+        self.assertEqual([user["id"] for user in item["linked_users"]], [self.owner.id])
+
+    def test_national_ids_are_normalized_in_lookups(self):
+        card = IdentityEvidence.objects.create(
+            title="Card", full_name="Sara Ahmadi", details={"national_id": "۲۵۸۱-۸۰۱-۹۸۰"},
+            case=self.case, recorder=self.officer, description="description",
+        )
+        response = self.lookup(self.officer, **{"details.national_id": "2581801980"})
+        self.assertEqual([item["id"] for item in response.json()], [card.id])
+        response = self.lookup(self.officer, **{"details.national_id": "۰۰۱ ۲۳۴ ۵۶۷۸"})
+        self.assertCountEqual([item["id"] for item in response.json()], [self.wallet.id, self.passport.id])
+
+    def test_stored_national_ids_are_backfilled(self):
+        IdentityEvidence.objects.filter(pk=self.license.pk).update(details={"national_id": "۰۰۹۹-۹۹۹۹۹۹"})
+        call_command("normalize_identity_national_ids", stdout=StringIO())
+        self.license.refresh_from_db()
+        self.assertEqual(self.license.details, {"national_id": "0099999999"})
+        self.assertEqual(self.license.details_national_id, "0099999999")
+
+    def test_lookup_validation_and_access(self):
+        self.assertEqual(self.lookup(self.officer).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.lookup(self.officer, **{"details.bad key": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.lookup(self.outsider, **{"details.national_id": "0012345678"})
+        self.assertEqual(response.json(), [])
@@ -1,12 +1,18 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import EvidenceViewSet
+from .views import EvidenceViewSet, EvidenceUploadCreateView, EvidenceUploadDetailView, EvidenceMediaView, VehicleLookupView, IdentityLookupView
 
 router = DefaultRouter()
 router.register(r'', EvidenceViewSet, basename='evidence')
 
 
+# Registered before the router so `uploads/`, `media/`, `vehicles/` and `identities/` are not taken for an evidence id
 urlpatterns = [
-    
+    path('uploads/', EvidenceUploadCreateView.as_view(), name='evidence-upload-create'),
+    path('uploads/<uuid:pk>/', EvidenceUploadDetailView.as_view(), name='evidence-upload-detail'),
+    path('media/<path:name>', EvidenceMediaView.as_view(), name='evidence-media'),
+    path('vehicles/', VehicleLookupView.as_view(), name='evidence-vehicle-lookup'),
+    path('identities/', IdentityLookupView.as_view(), name='evidence-identity-lookup'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
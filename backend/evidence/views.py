@@ -1,10 +1,23 @@
-from rest_framework import viewsets, status
+import re
+
+from django.db.models import Q
+from django.http import Http404
+from rest_framework import viewsets, status, generics
+from rest_framework.views import APIView
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, extend_schema_view, PolymorphicProxySerializer, OpenApiExample
+from drf_spectacular.utils import extend_schema, extend_schema_view, PolymorphicProxySerializer, OpenApiExample, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from core.pagination import CreatedAtCursorPagination
 
 from .serializers import *
+# After the star import, which also carries django.core.exceptions.ValidationError from the models
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from .services import (append_upload_chunk, discard_upload, build_media_response, check_media_signature,
+                       filter_identity_details)
+from .permissions import can_access_case, filter_visible_evidence
+from .storage import get_evidence_media_storage
 
 
 serializers_map = {
@@ -169,6 +182,8 @@ response_examples = [
             {
                 "id": 1,
                 "image": "http://127.0.0.1:8000/media/evidence/bio/image.jpg",
+                "thumbnail": "http://127.0.0.1:8000/media/evidence/bio/thumbnails/image_thumbnail.jpg",
+                "medium": "http://127.0.0.1:8000/media/evidence/bio/medium/image_medium.jpg",
                 "uploaded_at": "2026-02-18T14:41:29.854313+03:30"
             }
         ],
@@ -196,16 +211,12 @@ response_examples = [
 )
 class EvidenceViewSet(viewsets.ModelViewSet):    
 
-    queryset = Evidence.objects.all().select_related(
-        "witnessevidence",
-        "bioevidence",
-        "vehicleevidence",
-        "identityevidence",
-        "otherevidence"
-    )
+    # Subtype rows are loaded per evidence type by `EvidencePolymorphicSerializer`
+    queryset = Evidence.objects.all()
     serializer_class = EvidencePolymorphicSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -265,18 +276,16 @@ class EvidenceViewSet(viewsets.ModelViewSet):
     )
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
-        evidence_type = instance.get_evidence_type_display().lower()
-
-
-        serializer_class = serializers_map.get(evidence_type)
+        subtype = instance.get_subtype()
+        serializer_class = serializers_map.get(instance.evidence_type)
 
-        if not serializer_class:
+        if not serializer_class or subtype is None:
             return Response(
                 {"error": "Invalid evidence type. Cannot update."},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        serializer = serializer_class(instance, data=request.data, partial=True, context={'request': request})
+        serializer = serializer_class(subtype, data=request.data, partial=True, context={'request': request})
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
 
@@ -286,4 +295,200 @@ class EvidenceViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
-    
+
+
+@extend_schema(
+    summary="Start a chunked evidence upload",
+    description=(
+        "Creates a resumable upload for a large evidence file (e.g. a witness video). "
+        "Send the file with `PUT /uploads/{id}/` in chunks, then pass the upload id as `media_upload` "
+        "(witness evidence) or in `image_uploads` (bio evidence) when creating the evidence."
+    ),
+)
+class EvidenceUploadCreateView(generics.CreateAPIView):
+    serializer_class = EvidenceUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        summary="Get the state of a chunked upload",
+        description="`offset` is where the next chunk should start, e.g. when resuming an interrupted upload.",
+    ),
+    put=extend_schema(
+        summary="Upload a chunk",
+        description=(
+            "Appends the raw request body at `Upload-Offset`. When the last chunk arrives the SHA-256 "
+            "checksum is verified and `is_complete` becomes true. A 409 means the offset is stale; "
+            "GET the upload and resume from its `offset`."
+        ),
+        request={"application/octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter("Upload-Offset", OpenApiTypes.INT, OpenApiParameter.HEADER, required=True),
+        ],
+    ),
+    delete=extend_schema(summary="Abort a chunked upload"),
+)
+class EvidenceUploadDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = EvidenceUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return EvidenceUpload.objects.filter(created_by=self.request.user)
+
+    def put(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Upload-Offset and Content-Length headers are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # The body is streamed to disk as is; `request.data` must not be accessed here.
+        upload = append_upload_chunk(upload, request.stream, offset, length)
+        return Response(self.get_serializer(upload).data)
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+
+
+@extend_schema(
+    summary="Download an evidence file",
+    description=(
+        "Serves witness media and bio evidence images (and their variants) to users who can access "
+        "one of the cases referencing the file. Supports single byte `Range` requests and "
+        "`If-None-Match`; the `url`s returned by the evidence endpoints point here. Those URLs are "
+        "signed for the requesting user (`user`, `expires`, `signature`), so they work without the "
+        "Authorization header, e.g. in `<img src>`, until they expire."
+    ),
+    parameters=[
+        OpenApiParameter("user", OpenApiTypes.INT),
+        OpenApiParameter("expires", OpenApiTypes.INT),
+        OpenApiParameter("signature", OpenApiTypes.STR),
+        OpenApiParameter("Range", OpenApiTypes.STR, OpenApiParameter.HEADER),
+        OpenApiParameter("If-None-Match", OpenApiTypes.STR, OpenApiParameter.HEADER),
+    ],
+    responses={
+        (200, "application/octet-stream"): OpenApiTypes.BINARY,
+        (206, "application/octet-stream"): OpenApiTypes.BINARY,
+        304: None,
+        416: None,
+    },
+)
+class EvidenceMediaView(APIView):
+    # Authenticated by the JWT or by the signature of the URL (see `sign_media_name`)
+    permission_classes = [AllowAny]
+
+    def get_cases(self, name):
+        witness_cases = WitnessEvidence.objects.filter(media_file=name).values("case_id")
+        bio_cases = BioEvidenceImage.objects.filter(
+            Q(image=name) | Q(thumbnail=name) | Q(medium=name)
+        ).values("evidence__case_id")
+        return Case.objects.filter(Q(pk__in=witness_cases) | Q(pk__in=bio_cases))
+
+    def get_user(self, request, name):
+        if request.user.is_authenticated:
+            return request.user
+        user_id = check_media_signature(name, request.query_params)
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id is not None else None
+        if user is None:
+            raise NotAuthenticated()
+        return user
+
+    def get(self, request, name):
+        user = self.get_user(request, name)
+        # Files are shared between evidences with the same content, access to any of their cases is enough.
+        # Files the user cannot access are reported as missing rather than forbidden.
+        if not any(can_access_case(user, case) for case in self.get_cases(name)):
+            raise Http404
+
+        storage = get_evidence_media_storage()
+        if not storage.exists(name):
+            raise Http404
+        return build_media_response(request, storage, name)
+
+
+@extend_schema(
+    summary="Find vehicles by plate or serial number across cases",
+    description=(
+        "Returns the vehicle evidence matching a license plate or VIN, with its case. Numbers are "
+        "compared normalized (no spacing, Persian/Arabic digits as Latin digits), so `۱۲ ب ۳۴۵` "
+        "matches `12ب345`. With `match=prefix` partial numbers are accepted. Only evidence visible in "
+        "the evidence lists is returned."
+    ),
+    parameters=[
+        OpenApiParameter("plate", OpenApiTypes.STR),
+        OpenApiParameter("serial", OpenApiTypes.STR),
+        OpenApiParameter("match", OpenApiTypes.STR, enum=["exact", "prefix"]),
+    ],
+    responses=VehicleLookupSerializer(many=True),
+)
+class VehicleLookupView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = VehicleLookupSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        params = VehicleLookupQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        lookup = "startswith" if data["match"] == "prefix" else "exact"
+
+        conditions = Q()
+        if data["plate"]:
+            conditions |= Q(**{f"plate_number_normalized__{lookup}": data["plate"]})
+        if data["serial"]:
+            conditions |= Q(**{f"serial_number_normalized__{lookup}": data["serial"]})
+
+        queryset = VehicleEvidence.objects.filter(conditions).select_related("case").order_by("-created_at", "-id")
+        return filter_visible_evidence(queryset, self.request.user)
+
+
+IDENTITY_DETAIL_PARAM_PREFIX = "details."
+IDENTITY_DETAIL_KEY_RE = re.compile(r"^[\w-]{1,64}$")
+
+
+@extend_schema(
+    summary="Find identity evidence by detail keys",
+    description=(
+        "Filters identity evidence by any key of `details`, passed as `details.<key>=<value>` query "
+        "parameters (values are compared as text), e.g. `?details.national_id=0012345678`. Each result "
+        "lists the users whose national ID matches `details.national_id`. Only evidence visible in "
+        "the evidence lists is returned."
+    ),
+    parameters=[
+        OpenApiParameter("details.national_id", OpenApiTypes.STR),
+        OpenApiParameter("details.father_name", OpenApiTypes.STR),
+    ],
+    responses=IdentityLookupSerializer(many=True),
+)
+class IdentityLookupView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = IdentityLookupSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    def get_details_filter(self) -> dict[str, str]:
+        details = {}
+        for param, value in self.request.query_params.items():
+            if not param.startswith(IDENTITY_DETAIL_PARAM_PREFIX):
+                continue
+            key = param[len(IDENTITY_DETAIL_PARAM_PREFIX):]
+            if not IDENTITY_DETAIL_KEY_RE.match(key):
+                raise ValidationError({param: "Detail keys may only contain letters, digits, '_' and '-'."})
+            details[key] = value.strip()
+
+        if not details:
+            raise ValidationError({"detail": "Provide at least one details.<key>=<value> parameter."})
+        return details
+
+    def get_queryset(self):
+        queryset = filter_identity_details(IdentityEvidence.objects.all(), self.get_details_filter())
+        queryset = queryset.select_related("case").order_by("-created_at", "-id")
+        return filter_visible_evidence(queryset, self.request.user)
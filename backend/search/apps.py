@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class SearchConfig(AppConfig):
+    name = "search"
+
+    def ready(self):
+        import search.signals
+
+        post_migrate.connect(search.signals.search_app_migrated, sender=self)
@@ -0,0 +1,34 @@
+"""
+Rebuild the full-text search index (`search.SearchEntry`) from every case, complaint,
+crime scene and evidence.
+
+Entries are maintained when those records are saved; run this after enabling search on an
+existing database or after changing them with queryset `update()`s.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cases.models import Case, Complaint, CrimeScene
+from evidence.models import EVIDENCE_TYPE_MODELS
+from search.services import clear_index, create_index_structures, index_object
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of cases, complaints, crime scenes and evidence."
+
+    def handle(self, *args, **options):
+        create_index_structures()
+
+        querysets = [Case.objects.all(), Complaint.objects.all(), CrimeScene.objects.all()]
+        # Evidence is indexed through its subtype so transcripts and identity details are included
+        querysets += [model.objects.all() for model in EVIDENCE_TYPE_MODELS.values()]
+
+        indexed = 0
+        with transaction.atomic():
+            clear_index()
+            for queryset in querysets:
+                for obj in queryset.iterator(chunk_size=500):
+                    index_object(obj)
+                    indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} record(s)."))
@@ -0,0 +1,41 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    """
+    One searchable record (a case, complaint, crime scene or evidence) in the full-text index.
+    `title` and `body` hold the indexed text; the inverted index itself is `document` (GIN
+    indexed) on PostgreSQL and the `search_entry_fts` FTS5 table on SQLite (see search.services).
+    """
+    class Kind(models.TextChoices):
+        CASE = "case", "Case"
+        COMPLAINT = "complaint", "Complaint"
+        CRIME_SCENE = "crime_scene", "Crime Scene"
+        EVIDENCE = "evidence", "Evidence"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices, verbose_name="Kind")
+    object_id = models.PositiveIntegerField(verbose_name="Object ID")
+    case = models.ForeignKey(
+        "cases.Case",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Case",
+        help_text="Case the record belongs to, used for access checks.",
+    )
+    title = models.CharField(max_length=255, verbose_name="Title")
+    body = models.TextField(blank=True, verbose_name="Body")
+    document = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated at")
+
+    class Meta:
+        verbose_name = "Search entry"
+        verbose_name_plural = "Search entries"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="search_entry_kind_object_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}: {self.title}"
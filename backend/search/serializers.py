@@ -0,0 +1,25 @@
+from rest_framework import serializers
+
+from .models import SearchEntry
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(help_text="Words to look for; results contain all of them.")
+    kind = serializers.ListField(
+        child=serializers.ChoiceField(choices=SearchEntry.Kind.choices),
+        required=False,
+        help_text="Only return these kinds of records.",
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="object_id", read_only=True, help_text="ID of the record of this `kind`.")
+    case_id = serializers.IntegerField(read_only=True, allow_null=True)
+    # Annotated by `search.services.search`
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = SearchEntry
+        fields = ["kind", "id", "case_id", "title", "rank"]
+        read_only_fields = fields
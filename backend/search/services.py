@@ -0,0 +1,199 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F, Q
+
+from accounts.permissions import get_permission_snapshot
+from cases.models import Case, Complaint, CrimeScene
+from cases.services import get_listable_cases
+from cases.submissiontypes import ComplaintSubmissionType, CrimeSceneSubmissionType
+from evidence.models import Evidence, IdentityEvidence, WitnessEvidence
+from evidence.permissions import filter_visible_evidence
+from submissions.models import Submission
+
+from .models import SearchEntry
+
+# SQLite full-text table holding `title` and `body` of each entry, keyed by the entry id
+FTS_TABLE = "search_entry_fts"
+
+# Text search configuration used on PostgreSQL. Records are mostly Persian, so the text is
+# tokenized without language specific stemming.
+SEARCH_CONFIG = "simple"
+
+_TERM_RE = re.compile(r"\w+")
+
+
+# ---------------------------------------------------------------------
+# Index structures
+# ---------------------------------------------------------------------
+
+def create_index_structures(using=None) -> None:
+    """
+    Create the database specific part of the index: the GIN index on `SearchEntry.document`
+    on PostgreSQL, the FTS5 table on SQLite. Runs after every migrate.
+    """
+    db = connections[using or DEFAULT_DB_ALIAS]
+    with db.cursor() as cursor:
+        if db.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS search_entry_document_gin "
+                f"ON {SearchEntry._meta.db_table} USING gin (document)"
+            )
+        elif db.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, body)"
+            )
+
+
+# ---------------------------------------------------------------------
+# Indexing
+# ---------------------------------------------------------------------
+
+def _flatten(value) -> list[str]:
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _flatten(item)]
+    if isinstance(value, (list, tuple)):
+        return [text for item in value for text in _flatten(item)]
+    return [] if value is None else [str(value)]
+
+
+def get_evidence_body(evidence: Evidence) -> str:
+    parts = [evidence.description]
+    if isinstance(evidence, WitnessEvidence):
+        parts.append(evidence.transcript or "")
+    if isinstance(evidence, IdentityEvidence):
+        parts.append(evidence.full_name)
+        parts.extend(_flatten(evidence.details))
+    return "\n".join(part for part in parts if part)
+
+
+def _entry_values(obj) -> tuple[str, dict]:
+    if isinstance(obj, Case):
+        return SearchEntry.Kind.CASE, {"case_id": obj.pk, "title": obj.title, "body": obj.description}
+    if isinstance(obj, Complaint):
+        return SearchEntry.Kind.COMPLAINT, {"case_id": None, "title": obj.title, "body": obj.description}
+    if isinstance(obj, CrimeScene):
+        return SearchEntry.Kind.CRIME_SCENE, {"case_id": None, "title": obj.title, "body": obj.description}
+    if isinstance(obj, Evidence):
+        return SearchEntry.Kind.EVIDENCE, {"case_id": obj.case_id, "title": obj.title, "body": get_evidence_body(obj)}
+    raise TypeError(f"{type(obj).__name__} is not searchable")
+
+
+def index_object(obj) -> SearchEntry:
+    """Add `obj` to the search index or refresh its entry."""
+    kind, values = _entry_values(obj)
+    values["title"] = values["title"][:255]
+    entry, _ = SearchEntry.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=values)
+
+    if connection.vendor == "postgresql":
+        SearchEntry.objects.filter(pk=entry.pk).update(
+            document=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("body", weight="B", config=SEARCH_CONFIG)
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+                [entry.pk, entry.title, entry.body],
+            )
+    return entry
+
+
+def remove_object(obj) -> None:
+    kind, _ = _entry_values(obj)
+    # Rows of the FTS table are removed by the SearchEntry post_delete receiver
+    for entry in SearchEntry.objects.filter(kind=kind, object_id=obj.pk):
+        entry.delete()
+
+
+def clear_index() -> None:
+    SearchEntry.objects.all().delete()
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+
+def remove_fts_row(entry_id: int) -> None:
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry_id])
+
+
+# ---------------------------------------------------------------------
+# Searching
+# ---------------------------------------------------------------------
+
+def get_visible_entries(user):
+    """
+    Entries `user` may find, following the list views of each record:
+    - cases: the case list (`get_listable_cases`)
+    - evidence: the evidence list (`evidence.view_evidence` or recorded by the user) and the
+      evidence list of the cases they lead or supervise
+    - complaints / crime scenes: submissions the user created, or whose current stage targets
+      them or one of their permissions
+    """
+    snapshot = get_permission_snapshot(user)
+    submissions = Submission.objects.filter(
+        Q(created_by=user)
+        | Q(current_target_user=user)
+        | Q(current_target_permission__in=list(snapshot.permissions))
+    )
+
+    if snapshot.has_perm("evidence.view_evidence"):
+        evidence_filter = Q(kind=SearchEntry.Kind.EVIDENCE)
+    else:
+        evidence_filter = Q(
+            kind=SearchEntry.Kind.EVIDENCE,
+            object_id__in=filter_visible_evidence(Evidence.objects.all(), user).values("pk"),
+        )
+
+    return SearchEntry.objects.filter(
+        Q(kind=SearchEntry.Kind.CASE, case__in=get_listable_cases(user).values("pk"))
+        | Q(
+            kind=SearchEntry.Kind.COMPLAINT,
+            object_id__in=submissions.filter(submission_type=ComplaintSubmissionType.type_key).values("object_id"),
+        )
+        | Q(
+            kind=SearchEntry.Kind.CRIME_SCENE,
+            object_id__in=submissions.filter(submission_type=CrimeSceneSubmissionType.type_key).values("object_id"),
+        )
+        | evidence_filter
+    )
+
+
+def search(user, text: str, kinds=None):
+    """
+    Entries matching every term of `text` that `user` may see, best matches first, annotated
+    with their `rank`.
+    """
+    terms = _TERM_RE.findall(text)
+    queryset = get_visible_entries(user)
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == "postgresql":
+        query = SearchQuery(" ".join(terms), config=SEARCH_CONFIG)
+        return (
+            queryset
+            .filter(document=query)
+            .annotate(rank=SearchRank(F("document"), query))
+            .order_by("-rank", "-id")
+        )
+
+    # SQLite: join the FTS5 table so bm25() is evaluated in the MATCH query. Terms are quoted
+    # so user input is never parsed as FTS5 query syntax.
+    match = " ".join('"%s"' % term for term in terms)
+    return (
+        queryset
+        .extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {SearchEntry._meta.db_table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+            select={"rank": f"-bm25({FTS_TABLE}, 10.0, 1.0)"},
+        )
+        .order_by("-rank", "-id")
+    )
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cases.models import Case, Complaint, CrimeScene
+from evidence.models import Evidence, EVIDENCE_TYPE_MODELS
+
+from .models import SearchEntry
+from .services import create_index_structures, index_object, remove_object, remove_fts_row
+
+SEARCHABLE_MODELS = [Case, Complaint, CrimeScene, Evidence, *EVIDENCE_TYPE_MODELS.values()]
+
+# Saves limited to other fields (e.g. `case.save(update_fields=["status"])`) leave the index as is
+INDEXED_FIELDS = {"title", "description", "transcript", "full_name", "details", "case"}
+
+
+def search_app_migrated(sender, using=None, **kwargs):
+    create_index_structures(using)
+
+
+def searchable_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_object(instance)
+
+
+def searchable_deleted(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+for model in SEARCHABLE_MODELS:
+    post_save.connect(searchable_saved, sender=model, dispatch_uid=f"search_index_{model._meta.label_lower}")
+    post_delete.connect(searchable_deleted, sender=model, dispatch_uid=f"search_remove_{model._meta.label_lower}")
+
+
+@receiver(post_delete, sender=SearchEntry)
+def search_entry_deleted(sender, instance, **kwargs):
+    remove_fts_row(instance.pk)
@@ -0,0 +1,116 @@
+from django.contrib.auth.models import Permission
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from cases.models import Case, Complaint
+from cases.submissiontypes import ComplaintSubmissionType
+from evidence.models import IdentityEvidence, WitnessEvidence
+from submissions.service import create_submission
+
+
+class SearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.detective = User.objects.create_user(
+            username="detective",
+            password="pass12345",
+            national_id="7200000001",
+            phone_number="+989127200001",
+        )
+        cls.chief = User.objects.create_user(
+            username="chief",
+            password="pass12345",
+            national_id="7200000002",
+            phone_number="+989127200002",
+        )
+        cls.chief.user_permissions.add(Permission.objects.get(codename="view_case"))
+        cls.citizen = User.objects.create_user(
+            username="citizen",
+            password="pass12345",
+            national_id="7200000003",
+            phone_number="+989127200003",
+        )
+
+        cls.case = Case.objects.create(
+            title="Warehouse robbery",
+            description="Crates stolen from the harbour warehouse",
+            crime_datetime=timezone.now(),
+            lead_detective=cls.detective,
+        )
+        cls.other_case = Case.objects.create(
+            title="Harbour fire",
+            description="Fire at the harbour docks",
+            crime_datetime=timezone.now(),
+        )
+        cls.witness = WitnessEvidence.objects.create(
+            case=cls.case,
+            recorder=cls.chief,
+            title="Night guard statement",
+            description="Statement of the guard",
+            transcript="I saw a blue van near the harbour gate",
+        )
+        cls.identity = IdentityEvidence.objects.create(
+            case=cls.other_case,
+            recorder=cls.chief,
+            title="Wallet",
+            description="Wallet found on the docks",
+            full_name="Reza Karimi",
+            details={"father_name": "Hossein"},
+        )
+
+    def search(self, user, query, **params):
+        self.client.force_authenticate(user=user)
+        res = self.client.get(reverse("search"), {"q": query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return [(item["kind"], item["id"]) for item in res.json()]
+
+    def test_results_follow_list_access_rules(self):
+        # The detective only sees their own case and its evidence
+        self.assertCountEqual(
+            self.search(self.detective, "harbour"),
+            [("case", self.case.id), ("evidence", self.witness.id)],
+        )
+        # `cases.view_case` opens every case, but evidence still needs its own permission
+        self.assertCountEqual(
+            self.search(self.chief, "harbour", kind="case"),
+            [("case", self.case.id), ("case", self.other_case.id)],
+        )
+        self.assertEqual(self.search(self.citizen, "harbour"), [])
+
+    def test_evidence_text_is_indexed(self):
+        self.assertEqual(self.search(self.detective, "blue van"), [("evidence", self.witness.id)])
+
+        self.chief.user_permissions.add(Permission.objects.get(codename="view_evidence"))
+        self.assertEqual(self.search(User.objects.get(pk=self.chief.pk), "hossein"), [("evidence", self.identity.id)])
+
+    def test_index_follows_changes(self):
+        self.case.title = "Museum heist"
+        self.case.save()
+        self.assertEqual(self.search(self.detective, "museum"), [("case", self.case.id)])
+        self.assertEqual(self.search(self.detective, "warehouse robbery"), [])
+
+        self.witness.delete()
+        self.assertEqual(self.search(self.detective, "van"), [])
+
+    def test_complaint_is_visible_to_its_submitter(self):
+        complaint = Complaint.objects.create(
+            title="Stolen bicycle",
+            description="My bicycle was taken",
+            crime_datetime=timezone.now(),
+        )
+        create_submission(
+            submission_type_cls=ComplaintSubmissionType,
+            target=complaint,
+            created_by=self.citizen,
+        )
+
+        self.assertEqual(self.search(self.citizen, "bicycle"), [("complaint", complaint.id)])
+        self.assertEqual(self.search(self.detective, "bicycle"), [])
+
+    def test_query_is_required(self):
+        self.client.force_authenticate(user=self.detective)
+        res = self.client.get(reverse("search"))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
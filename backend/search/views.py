@@ -0,0 +1,45 @@
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+
+from .serializers import SearchQuerySerializer, SearchResultSerializer
+from .services import search
+
+
+@extend_schema(
+    summary="Search cases, complaints, crime scenes and evidence",
+    description=(
+        "Full-text search over case, complaint and crime scene titles and descriptions, and evidence "
+        "titles, descriptions, witness transcripts and identity details. Only records the user can "
+        "see in the corresponding list views are returned, best matches first."
+    ),
+    parameters=[
+        OpenApiParameter("q", str, required=True, description="Words to look for; results contain all of them."),
+        OpenApiParameter("kind", str, many=True, enum=["case", "complaint", "crime_scene", "evidence"]),
+        OpenApiParameter("limit", int, description="Maximum number of results (1-100, default 20)."),
+    ],
+    examples=[
+        OpenApiExample(
+            "Search response",
+            response_only=True,
+            value=[
+                {"kind": "case", "id": 12, "case_id": 12, "title": "Warehouse robbery", "rank": 0.61},
+                {"kind": "evidence", "id": 40, "case_id": 12, "title": "Night guard statement", "rank": 0.24},
+            ],
+        ),
+    ],
+)
+class SearchView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = SearchResultSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        params = SearchQuerySerializer(data={
+            "q": self.request.query_params.get("q", ""),
+            "kind": self.request.query_params.getlist("kind"),
+            "limit": self.request.query_params.get("limit", 20),
+        })
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return search(self.request.user, data["q"], kinds=data.get("kind"))[:data["limit"]]
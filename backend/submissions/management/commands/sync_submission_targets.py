@@ -0,0 +1,43 @@
+"""
+Recompute the denormalized `current_target_user` / `current_target_permission`
+columns of every submission from its current stage.
+
+Normally these are kept in sync by `Submission.save` and `SubmissionStage.save`;
+run this after the columns are first added or after editing stages in bulk.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from submissions.models import Submission, current_stage_prefetch
+
+
+class Command(BaseCommand):
+    help = "Recompute the current stage targets stored on submissions. Idempotent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of submissions written per bulk update.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        changed = []
+
+        with transaction.atomic():
+            submissions = Submission.objects.prefetch_related(current_stage_prefetch())
+            for submission in submissions.iterator(chunk_size=batch_size):
+                before = (submission.current_target_user_id, submission.current_target_permission)
+                submission.sync_current_target()
+                if before != (submission.current_target_user_id, submission.current_target_permission):
+                    changed.append(submission)
+
+            Submission.objects.bulk_update(
+                changed,
+                ["current_target_user", "current_target_permission"],
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(changed)} submission(s)."))
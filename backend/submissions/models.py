@@ -1,6 +1,7 @@
 # approvals/models.py
 from core import settings
 from django.db import models
+from django.db.models import F, Prefetch
 from django.core.exceptions import ValidationError
 
 class SubmissionStatus(models.TextChoices):
@@ -30,6 +31,10 @@ class Submission(models.Model):
         verbose_name = "Submission"
         verbose_name_plural = "Submissions"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "current_target_user"], name="submission_status_tuser_idx"),
+            models.Index(fields=["status", "current_target_permission"], name="submission_status_tperm_idx"),
+        ]
 
     submission_type = models.CharField(
         max_length=64,
@@ -79,6 +84,53 @@ class Submission(models.Model):
         help_text="0-based index of the active workflow stage for this submission.",
     )
 
+    # Denormalized targets of the current stage, so inbox lookups do not need to join stages.
+    current_target_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="current_target_submissions",
+        verbose_name="Current target user",
+        help_text="Copy of `target_user` of the current stage.",
+    )
+
+    current_target_permission = models.CharField(
+        max_length=128,
+        blank=True,
+        null=True,
+        verbose_name="Current target permission",
+        help_text="Copy of `target_permission` of the current stage.",
+    )
+
+    def get_current_stage(self) -> "SubmissionStage | None":
+        """
+        The stage at `current_stage`. Uses the stage attached by `current_stage_prefetch()`
+        when it is still current, otherwise queries for it.
+        """
+        prefetched = getattr(self, "prefetched_current_stage", None)
+        if prefetched is not None:
+            stage = prefetched[0] if prefetched else None
+            if stage is None or stage.order == self.current_stage:
+                return stage
+        return self.stages.filter(order=self.current_stage).first()
+
+    def sync_current_target(self) -> None:
+        """
+        Copy the targets of the current stage into `current_target_user` / `current_target_permission`.
+        """
+        stage = self.get_current_stage()
+        self.current_target_user_id = stage.target_user_id if stage else None
+        self.current_target_permission = stage.target_permission if stage else None
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.sync_current_target()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "current_target_user", "current_target_permission"}
+        return super().save(*args, **kwargs)
+
 class SubmissionAction(models.Model):
     """
     An immutable event in a submission’s workflow history (e.g., SUBMIT, APPROVE, REJECT, RESUBMIT).
@@ -240,4 +292,25 @@ class SubmissionStage(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        return super().save(*args, **kwargs)
\ No newline at end of file
+        result = super().save(*args, **kwargs)
+
+        # Keep the denormalized targets on the submission in sync when the current stage changes.
+        Submission.objects.filter(pk=self.submission_id, current_stage=self.order).update(
+            current_target_user=self.target_user_id,
+            current_target_permission=self.target_permission,
+        )
+        return result
+
+
+def current_stage_prefetch(lookup: str = "stages") -> Prefetch:
+    """
+    Prefetch that attaches only the active stage of each submission as
+    `prefetched_current_stage`, for use with `Submission.get_current_stage`.
+
+    :param lookup: Path to the stages relation, e.g. "submission__stages" from a related model
+    """
+    return Prefetch(
+        lookup,
+        queryset=SubmissionStage.objects.filter(order=F("submission__current_stage")),
+        to_attr="prefetched_current_stage",
+    )
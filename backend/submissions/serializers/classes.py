@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from submissions import models
+from django.db.models import Manager
 from django.core.exceptions import ValidationError, PermissionDenied
 from submissions.models import Submission, SubmissionStatus, SubmissionAction, SubmissionActionType, SubmissionStage
 from submissions.submissiontypes.classes import BaseSubmissionType
 from accounts.models import User
+from accounts.permissions import get_permission_snapshot
 from drf_spectacular.utils import extend_schema_serializer, extend_schema_field, PolymorphicProxySerializer
 from submissions.service import create_submission
 from submissions.submissiontypes.registry import get_submission_type
@@ -28,16 +30,13 @@ class SubmissionActionSerializer(serializers.ModelSerializer):
 
         submission_type_cls = get_submission_type(submission.submission_type)
 
-        stage = SubmissionStage.objects.filter(
-            submission=submission,
-            order=submission.current_stage,
-        ).first()
+        stage = submission.get_current_stage()
 
         if stage is None:
             raise serializers.ValidationError({"submission": "Submission stage corrupted"})
 
-        if not (((stage.target_user is not None) and stage.target_user == user) 
-                or ((stage.target_permission is not None) and user.has_perm(stage.target_permission))):
+        if not (((stage.target_user_id is not None) and stage.target_user_id == user.id) 
+                or ((stage.target_permission is not None) and get_permission_snapshot(user).has_perm(stage.target_permission))):
             raise PermissionDenied()
 
         action_type: SubmissionActionType = attrs["action_type"]
@@ -103,6 +102,26 @@ def submission_target_schema():
         ],
         resource_type_field_name=None,
     )
+
+class SubmissionListSerializer(serializers.ListSerializer):
+    """
+    Resolves the targets of all the submissions with one query per submission type
+    and shares them with the child serializer through `context["submission_targets"]`.
+    """
+    def to_representation(self, data):
+        submissions = list(data.all() if isinstance(data, Manager) else data)
+
+        object_ids_by_type: dict[str, set[int]] = {}
+        for submission in submissions:
+            object_ids_by_type.setdefault(submission.submission_type, set()).add(submission.object_id)
+
+        self.context["submission_targets"] = {
+            type_key: get_submission_type(type_key).get_objects(object_ids)
+            for type_key, object_ids in object_ids_by_type.items()
+        }
+
+        return super().to_representation(submissions)
+
 @extend_schema_serializer(
     component_name="Submission",
     description="Request / Response body for creating a submission action."
@@ -116,6 +135,7 @@ class SubmissionSerializer(serializers.ModelSerializer):
             "target", "actions_history", "available_actions", "action_prompt", "created_by", "created_at"
         ]
         read_only_fields = ["status", "target", "actions_history", "available_actions", "action_prompt", "created_by", "created_at"]
+        list_serializer_class = SubmissionListSerializer
 
     payload = serializers.JSONField(
         write_only=True,
@@ -146,34 +166,34 @@ class SubmissionSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(submission_target_schema())
     def get_target(self, obj):
-        
-
         submission_type_cls = get_submission_type(obj.submission_type)
-        try:
-            target_obj = submission_type_cls.get_object(obj.object_id)
-        except submission_type_cls.model_class.DoesNotExist:
-            return None
+
+        preloaded = self.context.get("submission_targets", {}).get(obj.submission_type)
+        if preloaded is not None:
+            target_obj = preloaded.get(obj.object_id)
+            if target_obj is None:
+                return None
+        else:
+            try:
+                target_obj = submission_type_cls.get_object(obj.object_id)
+            except submission_type_cls.model_class.DoesNotExist:
+                return None
         return submission_type_cls.serializer_class(target_obj, context=self.context).data
     
-    def get_available_actions(self, obj: Submission) -> list[str]:
-        
+    def _get_actionable_stage(self, obj: Submission) -> SubmissionStage | None:
+        user = self.context["request"].user
+        if not get_submission_type(obj.submission_type).can_user_do_action(obj, user=user):
+            return None
+        return obj.get_current_stage()
 
-        if not get_submission_type(obj.submission_type).can_user_do_action(obj, user=self.context["request"].user):
-            return []
-        
-        
-        stage = SubmissionStage.objects.filter(submission=obj, order=obj.current_stage).first()
+    def get_available_actions(self, obj: Submission) -> list[str]:
+        stage = self._get_actionable_stage(obj)
         if stage is None:
             return []
         return [action for action in stage.allowed_actions]
     
     def get_action_prompt(self, obj: Submission) -> str:
-        
-
-        if not get_submission_type(obj.submission_type).can_user_do_action(obj, user=self.context["request"].user):
-            return ""
-        
-        stage = SubmissionStage.objects.filter(submission=obj, order=obj.current_stage).first()
+        stage = self._get_actionable_stage(obj)
         if stage is None:
             return ""
         return stage.prompt
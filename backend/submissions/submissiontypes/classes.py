@@ -3,7 +3,8 @@ from rest_framework.serializers import Serializer, DictField
 from django.db.models import Model
 from typing import ClassVar, Generic, Type, TypeVar
 from accounts.models import User
-from submissions.models import Submission, SubmissionAction, SubmissionStage
+from accounts.permissions import get_permission_snapshot
+from submissions.models import Submission, SubmissionAction
 from rest_framework.exceptions import ValidationError
 
 TModel = TypeVar("TModel", bound=Model)
@@ -28,15 +29,19 @@ class BaseSubmissionType(Generic[TModel]):
             return False
         if not cls.create_permissions:
             return True
-        return user.has_perms(cls.create_permissions)
+        return get_permission_snapshot(user).has_perms(cls.create_permissions)
     
     @classmethod
     def can_user_do_action(cls, submission: Submission, user: User) -> bool:
-        stage = SubmissionStage.objects.filter(submission=submission, order=submission.current_stage).first()
+        stage = submission.get_current_stage()
         if not stage:
             return True
-        
-        return (stage.target_user and stage.target_user == user) or (stage.target_permission and user.has_perm(stage.target_permission))
+
+        if stage.target_user_id is not None and stage.target_user_id == user.id:
+            return True
+        if not stage.target_permission:
+            return False
+        return get_permission_snapshot(user).has_perm(stage.target_permission)
 
     @classmethod
     def validate_submission_data(cls, data, context) -> Serializer:
@@ -85,6 +90,25 @@ class BaseSubmissionType(Generic[TModel]):
         :rtype: TModel
         """
         return cls.model_class._default_manager.get(pk=object_id)
+
+    @classmethod
+    def get_target_queryset(cls):
+        """
+        Queryset used when resolving targets in bulk. Override to add the
+        select_related / prefetch_related calls `serializer_class` needs.
+        """
+        return cls.model_class._default_manager.all()
+
+    @classmethod
+    def get_objects(cls, object_ids) -> dict[int, TModel]:
+        """
+        Bulk version of `get_object`
+
+        :param object_ids: The object_ids of the submission targets
+        :return: Submission targets keyed by their object_id. Missing targets are left out
+        :rtype: dict[int, TModel]
+        """
+        return cls.get_target_queryset().in_bulk(list(object_ids))
     
     @classmethod
     def create_object(cls, payload, serializer, context):
@@ -1,8 +1,16 @@
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from accounts.models import User
 from accounts.serializers.fields import NationalIDField
+from cases.models import Case, Complaint
+from cases.submissiontypes import ComplaintSubmissionType
+from .service import create_submission
 from .submissiontypes.registry import SUBMISSION_TYPES
 import json
 
@@ -54,4 +62,83 @@ class AuthFlowTests(APITestCase):
             "title" : "KMKH",
             "description" : "KMKH",
             "witnesses" : []
-        }
\ No newline at end of file
+        }
+
+class SubmissionInboxQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            username="creator",
+            password="pass12345",
+            national_id="1111111111",
+            phone_number="+989121234567",
+        )
+        cls.reviewer = User.objects.create_user(
+            username="reviewer",
+            password="pass12345",
+            national_id="2222222222",
+            phone_number="+989121234568",
+        )
+        cls.reviewer.user_permissions.add(Permission.objects.get(codename="complaint_initial_approve"))
+
+    def create_complaint_submissions(self, count):
+        for i in range(count):
+            complaint = Complaint.objects.create(
+                title=f"Complaint {i}",
+                description="description",
+                crime_datetime=timezone.now(),
+            )
+            complaint.complainants.set([self.creator])
+            create_submission(
+                submission_type_cls=ComplaintSubmissionType,
+                target=complaint,
+                created_by=self.creator,
+            )
+
+    def count_inbox_queries(self):
+        # Fresh user object and no cached permission snapshot, so every request loads permissions
+        cache.clear()
+        self.client.force_authenticate(User.objects.get(pk=self.reviewer.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("submission-inbox-list"), format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(res.json()), len(ctx.captured_queries)
+
+    def test_inbox_query_count_is_constant(self):
+        self.create_complaint_submissions(2)
+        rows_small, queries_small = self.count_inbox_queries()
+
+        self.create_complaint_submissions(8)
+        rows_large, queries_large = self.count_inbox_queries()
+
+        self.assertEqual(rows_small, 2)
+        self.assertEqual(rows_large, 10)
+        self.assertEqual(queries_small, queries_large)
+
+
+class SubmissionTypeListQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.detective = User.objects.create_user(
+            username="detective",
+            password="pass12345",
+            national_id="3333333333",
+            phone_number="+989121234569",
+        )
+        cls.detective.user_permissions.add(Permission.objects.get(codename="investigate_on_case"))
+        common = {"description": "description", "crime_datetime": timezone.now()}
+        Case.objects.create(title="Open", status=Case.Status.OPEN_INVESTIGATION, lead_detective=cls.detective, **common)
+        Case.objects.create(title="Interrogating", status=Case.Status.INTEROGATING_SUSPECTS, supervisor=cls.detective, **common)
+
+    def get_type_keys(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.get(pk=self.detective.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("submission-type-list"), format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {item["key"] for item in res.json()["types"]}, len(ctx.captured_queries)
+
+    def test_permissions_and_case_roles_are_read_in_one_query(self):
+        keys, queries = self.get_type_keys()
+        self.assertTrue({"INVESTIGATION_APPROVAL", "GUILT_ASSESMENT"} <= keys)
+        self.assertEqual(queries, 1)
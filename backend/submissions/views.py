@@ -7,12 +7,23 @@ from drf_spectacular.utils import extend_schema_view ,extend_schema, OpenApiExam
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import serializers
 from . import models
-from django.db.models import Exists, OuterRef, F, Q
+from .models import current_stage_prefetch
+from django.db.models import Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, NotFound
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from core.pagination import CreatedAtCursorPagination
+from accounts.permissions import (get_case_assignments_version,
+                                  get_permission_snapshot,
+                                  get_permissions_version,
+                                  user_cache_key,
+                                  versioned_cache_usable)
+from django.conf import settings
+from django.core.cache import cache
+
+SUBMISSION_TYPES_CACHE_KEY = "submissions:types:{user}:{permissions_version}:{case_assignments_version}"
 
 def submission_create_request_schema():
     variants = []
@@ -175,19 +186,16 @@ class SubmissionGetView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        user_perms = list(user.get_all_permissions())
-
-        current_stage_match = SubmissionStage.objects.filter(
-            submission_id=OuterRef("pk"),
-            order=OuterRef("current_stage"),
-        ).filter(
-            Q(target_user=user) | Q(target_permission__in=user_perms)
-        )
+        user_perms = list(get_permission_snapshot(user).permissions)
 
         return (
             Submission.objects
-            .annotate(can_see=Exists(current_stage_match))
-            .filter(Q(created_by=user) | Q(can_see=True))
+            .filter(
+                Q(created_by=user)
+                | Q(current_target_user=user)
+                | Q(current_target_permission__in=user_perms)
+            )
+            .prefetch_related("actions_history", current_stage_prefetch())
             .distinct()
         )
     
@@ -202,16 +210,17 @@ class SubmissionGetView(generics.RetrieveAPIView):
 class SubmissionMineListView(generics.ListAPIView):
     permission_classes=[IsAuthenticated]
     serializer_class=SubmissionSerializer
+    pagination_class = CreatedAtCursorPagination
     queryset = models.Submission.objects.all()
 
     def get_queryset(self):
         user = self.request.user
-        user_perms = list(user.get_all_permissions())
 
         return (
             models.Submission.objects.filter(
                 created_by=user
             )
+            .prefetch_related("actions_history", current_stage_prefetch())
             .distinct()
         )
 @extend_schema(
@@ -227,24 +236,19 @@ class SubmissionMineListView(generics.ListAPIView):
 class SubmissionInboxListView(generics.ListAPIView):
     permission_classes=[IsAuthenticated]
     serializer_class=SubmissionSerializer
+    pagination_class = CreatedAtCursorPagination
     queryset = models.Submission.objects.all()
 
     def get_queryset(self):
         user = self.request.user
-        user_perms = list(user.get_all_permissions())
-
-        current_stage_match = SubmissionStage.objects.filter(
-            submission_id=OuterRef("pk"),
-            order=OuterRef("current_stage"),
-        ).filter(
-            Q(target_user=user) | Q(target_permission__in=user_perms)
-        )
+        user_perms = list(get_permission_snapshot(user).permissions)
 
+        # Served by the (status, current_target_*) indexes on Submission.
         return (
             Submission.objects
             .filter(status=SubmissionStatus.PENDING)
-            .annotate(can_see=Exists(current_stage_match))
-            .filter(can_see=True)
+            .filter(Q(current_target_user=user) | Q(current_target_permission__in=user_perms))
+            .prefetch_related("actions_history", current_stage_prefetch())
         )
     
 @extend_schema(
@@ -287,11 +291,27 @@ class SubmissionTypeListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        if not versioned_cache_usable():
+            return Response({"types":self.get_types(request.user)})
+
+        # Types depend on permissions and on the status of the cases the user is assigned to
+        cache_key = SUBMISSION_TYPES_CACHE_KEY.format(
+            user=user_cache_key(request.user),
+            permissions_version=get_permissions_version(),
+            case_assignments_version=get_case_assignments_version(),
+        )
+        out = cache.get(cache_key)
+        if out is None:
+            out = self.get_types(request.user)
+            cache.set(cache_key, out, settings.API_CACHE_TIMEOUT)
+        return Response({"types":out})
+
+    def get_types(self, user):
         out = []
         for cls in SUBMISSION_TYPES.values():
-            if cls.can_user_submit(request.user):
+            if cls.can_user_submit(user):
                 out.append({"key": cls.type_key, "name": cls.display_name})
-        return Response({"types":out})
+        return out
 
 
 @extend_schema_view(
@@ -451,7 +471,7 @@ class SubmissionActionTypeGetView(APIView):
 
         is_target_user = (stage.target_user_id == request.user.id)
         has_target_perm = (
-            bool(stage.target_permission) and request.user.has_perm(stage.target_permission)
+            bool(stage.target_permission) and get_permission_snapshot(request.user).has_perm(stage.target_permission)
         )
 
         if not is_target_user and not has_target_perm: